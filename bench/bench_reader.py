@@ -0,0 +1,134 @@
+"""Drive the reader pipeline from a simulated RFID reader on a pseudo-terminal.
+
+A background thread writes bursts of CRC-framed inventory answers to the
+master side of a pty; the reader's own read and decode stages open the slave
+side with pyserial exactly as they would a USB reader. Reports decoded tags
+per second and the latency from a frame being written to its EPC coming out
+of the pipeline.
+
+Run from the repository root (Linux/macOS, needs pyserial):
+
+    python bench/bench_reader.py [--rate 500] [--burst 8] [--tags 200] [--seconds 10]
+"""
+
+import argparse
+import collections
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'reader'))
+
+import serial  # noqa: E402
+
+from dedup import DedupCache  # noqa: E402
+from epc_decoder import to_hex  # noqa: E402
+from framer import build_frame  # noqa: E402
+from metrics import metrics  # noqa: E402
+from pipeline import start_pipeline  # noqa: E402
+
+
+class FakeReader:
+    """A pty that emits ``rate`` frames per second in bursts of ``burst``.
+
+    EPCs are drawn from a pool of ``tags`` distinct tags, like a handful of
+    tagged items moving past the antenna. Every frame written is remembered
+    with its send time so the consumer can measure end-to-end latency.
+    """
+
+    def __init__(self, rate, burst, tags, seed=0):
+        self.rate = rate
+        self.burst = burst
+        rng = random.Random(seed)
+        self._rng = rng
+        self._pool = [rng.randbytes(12) for _ in range(tags)]
+        self._master, slave = os.openpty()
+        tty.setraw(slave)  # no echo or newline translation on the serial side
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.sent = collections.deque()  # (send_time, epc hex)
+        self.frames_sent = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _run(self):
+        interval = self.burst / self.rate
+        next_burst = time.perf_counter()
+        while not self._stop.is_set():
+            epcs = [self._rng.choice(self._pool) for _ in range(self.burst)]
+            data = b''.join(build_frame(b'\x00\xee\x00' + epc) for epc in epcs)
+            now = time.perf_counter()
+            self.sent.extend((now, to_hex(epc)) for epc in epcs)
+            os.write(self._master, data)
+            self.frames_sent += len(epcs)
+            next_burst += interval
+            delay = next_burst - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=500, help='frames per second written to the pty')
+    parser.add_argument('--burst', type=int, default=8, help='frames written back to back per burst')
+    parser.add_argument('--tags', type=int, default=200, help='distinct EPCs in the simulated population')
+    parser.add_argument('--seconds', type=float, default=10, help='length of the run')
+    parser.add_argument('--baud', type=int, default=57600, help='baud rate the port is opened with')
+    args = parser.parse_args()
+
+    device = FakeReader(args.rate, args.burst, args.tags)
+    ser = serial.Serial(device.port, args.baud, timeout=1)
+    tag_queue, stop_event = start_pipeline(ser)
+    recent_tags = DedupCache(ttl=60)
+    device.start()
+
+    latencies = []
+    unique = 0
+    mismatched = 0
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        try:
+            _, epc, _ = tag_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        received = time.perf_counter()
+        # Frames come out in the order they were written
+        sent_at, expected = device.sent.popleft()
+        if epc != expected:
+            mismatched += 1
+        latencies.append(received - sent_at)
+        if not recent_tags.seen(epc):
+            unique += 1
+
+    stop_event.set()
+    device.stop()
+    ser.close()
+
+    latencies.sort()
+    decode = metrics.snapshot()['latency'].get('frame_decode', {})
+    print(f"{device.frames_sent} frames written at {args.rate:.0f}/s in bursts of {args.burst} over {device.port}")
+    print(f"  decoded       {len(latencies)} tags ({len(latencies) / args.seconds:.0f}/s), "
+          f"{unique} unique after dedup, {mismatched} mismatched")
+    print(f"  pty->queue    p50 {percentile(latencies, 0.5) * 1000:.2f} ms  p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"  frame decode  p50 {decode.get('p50_ms')} ms  p99 {decode.get('p99_ms')} ms per chunk")
+
+
+if __name__ == '__main__':
+    main()
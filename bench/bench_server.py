@@ -0,0 +1,249 @@
+"""Load-test the server's /receive, /strings and /gate_status endpoints.
+
+Worker threads send a paced mix of requests over keep-alive connections: tag
+uploads to /receive, dashboard-style incremental polls of /strings, and gate
+status reads and updates. Every --report seconds it prints the history size,
+throughput and p50/p99 latency per endpoint, so you can see how ingest and
+reads behave as history grows. --prefill loads history through
+/receive/batch first, to measure at a given database size straight away.
+
+By default a local instance of server/app.py is started on a throwaway
+database (werkzeug's threaded server, as with app.run); pass --url to test
+a running server instead. Run from the repository root:
+
+    python bench/bench_server.py [--rate 200] [--seconds 60] [--workers 8]
+                                 [--mix 70:20:10] [--prefill 0] [--url http://127.0.0.1:5000]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server')
+
+OPERATIONS = ('receive', 'strings', 'gate_status')
+
+
+def start_local_server(data_dir):
+    """Serve server/app.py on a free local port and return its base URL."""
+    os.environ['IQOSGATE_DB'] = os.path.join(data_dir, 'bench.db')
+    os.environ['IQOSGATE_ARCHIVE_DIR'] = os.path.join(data_dir, 'archive')
+    os.environ['IQOSGATE_RETENTION_DAYS'] = '0'
+    sys.path.insert(0, SERVER_DIR)
+    from werkzeug.serving import make_server
+    import app as server_app
+
+    # Per-request log lines would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, server_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def utc_now_iso():
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class Pacer:
+    """Hands out send times ``1 / rate`` apart, shared by all workers."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = time.perf_counter()
+
+    def wait(self):
+        with self._lock:
+            slot = self._next = max(self._next + self.interval, time.perf_counter() - 1.0)
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Recorder:
+    """Latencies per operation since the last report, plus running totals."""
+
+    def __init__(self, history):
+        self.history = history
+        self._lock = threading.Lock()
+        self._interval = {op: [] for op in OPERATIONS}
+        self._errors = {op: 0 for op in OPERATIONS}
+        self.totals = {op: [] for op in OPERATIONS}
+
+    def record(self, op, seconds, ok, stored=0):
+        with self._lock:
+            if ok:
+                self._interval[op].append(seconds)
+                self.history += stored
+            else:
+                self._errors[op] += 1
+
+    def take(self):
+        with self._lock:
+            interval, self._interval = self._interval, {op: [] for op in OPERATIONS}
+            errors, self._errors = self._errors, {op: 0 for op in OPERATIONS}
+            for op, samples in interval.items():
+                self.totals[op].extend(samples)
+            return interval, errors, self.history
+
+
+def percentile_ms(samples, p):
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+
+class Worker(threading.Thread):
+    def __init__(self, base_url, pacer, recorder, weights, gates, seed, stop):
+        super().__init__(daemon=True)
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.pacer = pacer
+        self.recorder = recorder
+        self.weights = weights
+        self.gates = gates
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.stop = stop
+        self.cursor = 0
+        self.sent = 0
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return None, b''
+
+    def run(self):
+        while not self.stop.is_set():
+            self.pacer.wait()
+            op = self.rng.choices(OPERATIONS, self.weights)[0]
+            start = time.perf_counter()
+            stored = 0
+            if op == 'receive':
+                self.sent += 1
+                # Unique tags, so every upload is stored rather than merged as a duplicate
+                tag = f'{self.seed:08x}{self.sent:016x}'
+                gate = f'Bench{self.rng.randrange(self.gates)}'
+                status, _ = self.request('POST', '/receive', {'string': tag, 'timestamp': utc_now_iso(), 'device': gate})
+                stored = 1
+            elif op == 'strings':
+                status, body = self.request('GET', f'/strings?since={self.cursor}&limit=500')
+                if status == 200:
+                    self.cursor = json.loads(body)['cursor']
+            elif self.rng.random() < 0.5:
+                status, _ = self.request('GET', '/gate_status')
+            else:
+                gate = f'Bench{self.rng.randrange(self.gates)}'
+                status, _ = self.request('POST', '/gate_status', {'gate_id': gate, 'status': 1})
+            self.recorder.record(op, time.perf_counter() - start, status == 200, stored)
+
+
+def prefill(base_url, count, gates):
+    """Load ``count`` tag events through /receive/batch, 1000 per request."""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=120)
+    now = time.time()
+    start = time.perf_counter()
+    for first in range(0, count, 1000):
+        events = [{
+            'string': f'ffffffff{n:016x}',
+            'timestamp': datetime.fromtimestamp(now - (count - n), timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'device': f'Bench{n % gates}',
+        } for n in range(first, min(first + 1000, count))]
+        conn.request('POST', '/receive/batch', body=json.dumps(events), headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'Prefill failed with HTTP {response.status}')
+    elapsed = time.perf_counter() - start
+    print(f"Prefilled {count} events in {elapsed:.1f}s ({count / elapsed:.0f} events/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='server to test; a local one is started if omitted')
+    parser.add_argument('--rate', type=float, default=200, help='requests per second across all workers')
+    parser.add_argument('--seconds', type=float, default=60, help='length of the run')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent keep-alive connections')
+    parser.add_argument('--mix', default='70:20:10', help='receive:strings:gate_status request weights')
+    parser.add_argument('--gates', type=int, default=4, help='number of simulated gates')
+    parser.add_argument('--prefill', type=int, default=0, help='events loaded before the run starts')
+    parser.add_argument('--report', type=float, default=5, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    weights = [float(w) for w in args.mix.split(':')]
+    if len(weights) != len(OPERATIONS):
+        parser.error('--mix needs three weights, e.g. 70:20:10')
+
+    data_dir = None
+    base_url = args.url
+    if base_url is None:
+        data_dir = tempfile.TemporaryDirectory(prefix='iqosgate-bench-')
+        base_url = start_local_server(data_dir.name)
+    print(f"Target {base_url}, {args.rate:.0f} req/s over {args.workers} connections, mix {args.mix}")
+
+    if args.prefill:
+        prefill(base_url, args.prefill, args.gates)
+
+    recorder = Recorder(history=args.prefill)
+    pacer = Pacer(args.rate)
+    stop = threading.Event()
+    workers = [Worker(base_url, pacer, recorder, weights, args.gates, seed, stop) for seed in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    header = f"{'time':>6} {'history':>9} {'req/s':>7}" + ''.join(f" {op + ' p50/p99 ms':>26}" for op in OPERATIONS)
+    print(header)
+    started = time.perf_counter()
+    last = started
+    while last - started < args.seconds:
+        time.sleep(min(args.report, args.seconds - (last - started)))
+        now = time.perf_counter()
+        interval, errors, history = recorder.take()
+        done = sum(len(samples) for samples in interval.values())
+        columns = ''
+        for op in OPERATIONS:
+            samples = interval[op]
+            cell = f"{percentile_ms(samples, 0.5):.1f}/{percentile_ms(samples, 0.99):.1f}"
+            if errors[op]:
+                cell += f" ({errors[op]} err)"
+            columns += f" {cell:>26}"
+        print(f"{now - started:6.0f} {history:9d} {done / (now - last):7.0f}{columns}")
+        last = now
+
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=5)
+
+    print("Totals:")
+    elapsed = last - started
+    for op in OPERATIONS:
+        samples = recorder.totals[op]
+        print(f"  {op:<12} {len(samples):7d} ok  {len(samples) / elapsed:7.1f}/s  "
+              f"p50 {percentile_ms(samples, 0.5):7.2f} ms  p99 {percentile_ms(samples, 0.99):7.2f} ms")
+    if data_dir is not None:
+        data_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
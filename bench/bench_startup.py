@@ -0,0 +1,132 @@
+"""Measure how long the server and the reader take to start.
+
+Each run is a fresh interpreter, as after a reboot or a service restart, and
+reports the wall time of the whole process plus its phases: for the server,
+importing app.py and answering its first request (through Flask's test
+client, against a throwaway database with --prefill events in it), which
+also starts the compaction and announcement threads with the default
+retention settings; for the
+reader, importing rfid_alarm_final.py, creating the alarm service and
+raising the first alarm with SDL's silent driver (or with --no-audio).
+Plain interpreter startup is measured too, as the floor.
+
+Run from the repository root:
+
+    python bench/bench_startup.py [--runs 5] [--prefill 100000] [--no-audio] [--only server|reader]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SERVER_DIR = os.path.join(ROOT, 'server')
+READER_DIR = os.path.join(ROOT, 'reader')
+
+SERVER_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.app.test_client().get('/strings?limit=1')
+t2 = time.perf_counter()
+if response.status_code != 200:
+    raise SystemExit(f'/strings answered HTTP {response.status_code}')
+print(json.dumps({'import': t1 - t0, 'first_request': t2 - t1}))
+"""
+
+READER_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import rfid_alarm_final
+from alarm import AlarmService
+from metrics import metrics
+t1 = time.perf_counter()
+alarm = AlarmService(rfid_alarm_final.ALARM_SOUND, driver='dummy', enabled=%(audio)r)
+t2 = time.perf_counter()
+alarm.trigger()
+while not metrics.snapshot()['counters'].get('alarms'):
+    time.sleep(0.001)
+t3 = time.perf_counter()
+alarm.close()
+print(json.dumps({'import': t1 - t0, 'alarm_ready': t2 - t1, 'first_alarm': t3 - t2}))
+"""
+
+
+def prefill(data_dir, count):
+    """Store ``count`` events in the benchmark database before the first run."""
+    sys.path.insert(0, SERVER_DIR)
+    from repository import EventRepository
+
+    repository = EventRepository(os.path.join(data_dir, 'bench.db'))
+    now = time.time()
+    for first in range(0, count, 10000):
+        repository.append_many([
+            {'string': f'ffffffff{n:016x}', 'ts': now - (count - n), 'device': f'Bench{n % 4}'}
+            for n in range(first, min(first + 10000, count))
+        ])
+
+
+def run(script, cwd, env):
+    """Run ``script`` in a fresh interpreter; return its phases plus the process wall time."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', script], cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f'exit {result.returncode}')
+    lines = result.stdout.strip().splitlines()
+    phases = json.loads(lines[-1]) if lines else {}
+    phases['process'] = elapsed
+    return phases
+
+
+def report(name, runs):
+    phases = list(runs[0])
+    print(f"{name}:")
+    for phase in phases:
+        samples = [r[phase] * 1000 for r in runs]
+        print(f"  {phase:<14} median {statistics.median(samples):8.1f} ms  min {min(samples):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes started per target')
+    parser.add_argument('--prefill', type=int, default=0, help='events in the server database')
+    parser.add_argument('--no-audio', action='store_true', help='start the reader alarm without audio')
+    parser.add_argument('--only', choices=('server', 'reader'), help='measure just one target')
+    args = parser.parse_args()
+
+    data_dir = tempfile.TemporaryDirectory(prefix='iqosgate-startup-')
+    env = dict(os.environ,
+               IQOSGATE_DB=os.path.join(data_dir.name, 'bench.db'),
+               IQOSGATE_ARCHIVE_DIR=os.path.join(data_dir.name, 'archive'),
+               PYTHONDONTWRITEBYTECODE='1')
+    if args.prefill:
+        prefill(data_dir.name, args.prefill)
+        print(f"Server database prefilled with {args.prefill} events")
+
+    targets = [('interpreter', 'pass', ROOT)]
+    if args.only in (None, 'server'):
+        targets.append(('server', SERVER_SCRIPT, SERVER_DIR))
+    if args.only in (None, 'reader'):
+        targets.append(('reader', READER_SCRIPT % {'audio': not args.no_audio}, READER_DIR))
+
+    for name, script, cwd in targets:
+        try:
+            # One untimed run first, so every timed run finds the same warm page cache
+            run(script, cwd, env)
+            runs = [run(script, cwd, env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name}: failed to start: {e}")
+            continue
+        report(name, runs)
+    data_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
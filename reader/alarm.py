@@ -0,0 +1,84 @@
+import os
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+_STOP = object()
+
+
+class AlarmService:
+    """Play the alarm sound from a dedicated thread.
+
+    pygame is imported, the mixer initialised and the sound file decoded into
+    memory by the alarm thread when the first alarm is raised, so starting
+    the reader does not wait for SDL; after that ``trigger()`` costs no more
+    than a queue put on the tag path. Triggers that arrive while the alarm is
+    already sounding are coalesced into that playback instead of restarting
+    it. Pass ``driver='dummy'`` to run with SDL's silent audio driver on
+    machines without a sound card, or ``enabled=False`` to never load audio
+    at all; alarms are then only counted.
+    """
+
+    def __init__(self, sound_path, driver=None, enabled=True):
+        self.sound_path = sound_path
+        self.driver = driver
+        self.enabled = enabled
+        self._pygame = None
+        self._sound = None
+        self._channel = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def trigger(self):
+        self._queue.put(time.perf_counter())
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._sound is not None:
+            self._pygame.mixer.quit()
+
+    def _load(self):
+        if self.driver:
+            os.environ['SDL_AUDIODRIVER'] = self.driver
+        # pygame prints a banner on import unless told not to
+        os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+        try:
+            import pygame
+        except ImportError as e:
+            print(f"Alarm sound unavailable, continuing without audio: {e}")
+            return
+        self._pygame = pygame
+        try:
+            pygame.mixer.init()
+            self._sound = pygame.mixer.Sound(self.sound_path)  # decoded into memory here
+        except pygame.error as e:
+            print(f"Alarm sound unavailable, continuing without audio: {e}")
+
+    def _run(self):
+        loaded = not self.enabled
+        while True:
+            item = self._queue.get()
+            triggered = item
+            # Fold every trigger that is already waiting into this one
+            try:
+                while item is not _STOP:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if item is _STOP:
+                return
+            if not loaded:
+                self._load()
+                loaded = True
+            metrics.increment('alarms')
+            if self._sound is None:
+                continue
+            if self._channel is not None and self._channel.get_busy():
+                continue  # still sounding from an earlier trigger
+            self._channel = self._sound.play()
+            # From the oldest trigger being queued to the sound starting
+            metrics.observe('alarm_latency', time.perf_counter() - triggered)
@@ -0,0 +1,81 @@
+import gzip
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyStats
+
+# Seconds to establish a connection, and to wait for the server's answer
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+
+
+class ApiClient:
+    """Shared HTTP client for every request the reader makes to the server.
+
+    One ``requests.Session`` keeps its connections alive in a small pool, so
+    after the first request each upload or heartbeat is a single round trip
+    instead of a fresh TCP and TLS handshake. Every request has explicit
+    connect and read timeouts, JSON bodies can be gzip-compressed, and the
+    round-trip time of each request is recorded per URL.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), compress=False, pool_size=4):
+        self.timeout = timeout
+        self.compress = compress
+        self.session = requests.Session()
+        # Retries are left to the callers (the uploader has its own backoff)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._latency = {}
+
+    def post_json(self, url, payload, compress=None):
+        """POST ``payload`` as JSON and return the response.
+
+        ``compress`` overrides the client default for this request. Network
+        errors and timeouts are raised as ``requests.RequestException``.
+        """
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.compress if compress is None else compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._record(url, time.perf_counter() - start, ok)
+
+    def get(self, url, params=None):
+        """GET ``url``; gzip-encoded answers are inflated by ``requests``."""
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._record(url, time.perf_counter() - start, ok)
+
+    def _record(self, url, seconds, ok):
+        with self._lock:
+            stats = self._latency.get(url)
+            if stats is None:
+                stats = self._latency[url] = LatencyStats()
+            stats.record(seconds, ok)
+
+    def latency(self):
+        """Latency summary per URL."""
+        with self._lock:
+            return {url: stats.snapshot() for url, stats in self._latency.items()}
+
+    def close(self):
+        self.session.close()
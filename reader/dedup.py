@@ -0,0 +1,44 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DedupCache:
+    """Sliding-window duplicate filter keyed by EPC.
+
+    A key counts as a duplicate while it keeps being seen less than ``ttl``
+    seconds apart; every sighting pushes its expiry forward, so a tag left in
+    front of an antenna is reported once rather than once per window. Entries
+    are kept in least-recently-seen order, which lets expired ones be dropped
+    from the front, and the cache never holds more than ``max_size`` keys.
+    """
+
+    def __init__(self, ttl=60.0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> time last seen
+
+    def seen(self, key, now=None):
+        """Record a sighting of ``key``; return True if it is a duplicate."""
+        now = time.time() if now is None else now
+        with self._lock:
+            last_seen = self._entries.get(key)
+            duplicate = last_seen is not None and abs(now - last_seen) < self.ttl
+            self._entries[key] = max(now, last_seen) if duplicate else now
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return duplicate
+
+    def _evict(self, now):
+        entries = self._entries
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        while entries:
+            key, last_seen = next(iter(entries.items()))
+            if now - last_seen < self.ttl:
+                break
+            del entries[key]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,50 @@
+"""EPC decoding shared by all reader scripts.
+
+Everything here works directly on ``bytes``, ``bytearray`` or ``memoryview``
+and leaves the hex conversion to ``.hex()`` in C instead of formatting one
+byte at a time in Python.
+"""
+
+# Frame layout around the EPC: Len, Adr, reCmd, Status before it, CRC-16 after it
+EPC_OFFSET = 4
+TRAILER_SIZE = 2
+
+# EPC is reported as 8 groups of 3 hex characters (96 bits)
+EPC_BYTES = 12
+EPC_CHUNK = 3
+
+
+def to_hex(data):
+    """Hex string of raw serial data, without separators."""
+    return data.hex()
+
+
+def split_hex(hex_str, width):
+    """Split a hex string into ``width``-character chunks (the last may be shorter)."""
+    return [hex_str[i:i + width] for i in range(0, len(hex_str), width)]
+
+
+def _trim(hex_data):
+    # Only complete 3-character chunks are kept
+    return hex_data[:len(hex_data) - len(hex_data) % EPC_CHUNK]
+
+
+def decode_epc(frame):
+    """Return the EPC carried in one frame as a hex string."""
+    data = memoryview(frame)[EPC_OFFSET:len(frame) - TRAILER_SIZE][:EPC_BYTES]
+    return _trim(data.hex())
+
+
+def decode_epcs(frames):
+    """Decode a list of frames in one call."""
+    start = EPC_OFFSET
+    end = EPC_OFFSET + EPC_BYTES
+    full = EPC_BYTES * 2
+    result = []
+    append = result.append
+    for frame in frames:
+        hex_data = frame[start:min(end, len(frame) - TRAILER_SIZE)].hex()
+        # A full-length EPC needs no trimming
+        append(hex_data if len(hex_data) == full else _trim(hex_data))
+    return result
+
@@ -0,0 +1,107 @@
+"""Stream framing for the UHF reader's serial protocol.
+
+Every frame the reader sends looks like::
+
+    Len | Adr | reCmd | Status | Data ... | CRC-LSB | CRC-MSB
+
+``Len`` counts every byte after itself, so a whole frame is ``Len + 1`` bytes,
+and the CRC is CRC-16/MCRF4XX (preset 0xFFFF, reflected polynomial 0x8408)
+over everything before it.
+"""
+
+import time
+
+HEADER_SIZE = 4  # Len, Adr, reCmd, Status
+CRC_SIZE = 2
+MIN_FRAME_LEN = HEADER_SIZE - 1 + CRC_SIZE  # smallest valid Len value
+
+
+def _build_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc16(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def build_frame(body):
+    """Wrap ``Adr | reCmd | Status | Data`` in a length byte and CRC."""
+    frame = bytes([len(body) + CRC_SIZE]) + bytes(body)
+    return frame + crc16(frame).to_bytes(CRC_SIZE, 'little')
+
+
+class FrameParser:
+    """Turn arbitrary chunks of serial input into complete, checked frames.
+
+    Bytes are buffered until a whole frame has arrived, so a frame split across
+    two reads or several frames in one read are both handled. When the length
+    byte is implausible or the CRC does not match, one byte is skipped and the
+    parser resynchronises on the next candidate length byte. A partial frame
+    that gets no more bytes for ``frame_timeout`` seconds is treated as noise,
+    since the reader always sends a frame in one burst.
+    """
+
+    def __init__(self, check_crc=True, frame_timeout=0.1):
+        self.check_crc = check_crc
+        self.frame_timeout = frame_timeout
+        self.dropped_bytes = 0
+        self._buffer = bytearray()
+        self._last_data = 0.0
+
+    def feed(self, data, now=None):
+        """Add ``data`` to the buffer and return every complete frame as ``bytes``."""
+        now = time.monotonic() if now is None else now
+        frames = self.expire(now)
+        self._buffer += data
+        self._last_data = now
+        frames.extend(self._parse())
+        return frames
+
+    def expire(self, now=None):
+        """Resynchronise past a stale partial frame and return any frames behind it."""
+        now = time.monotonic() if now is None else now
+        frames = []
+        if not self._buffer or now - self._last_data < self.frame_timeout:
+            return frames
+        # Nothing more is coming for what is buffered, so a frame head still
+        # waiting for bytes can only be noise
+        while self._buffer:
+            del self._buffer[:1]
+            self.dropped_bytes += 1
+            frames.extend(self._parse())
+        return frames
+
+    def _parse(self):
+        buf = self._buffer
+        frames = []
+        pos = 0
+        while pos < len(buf):
+            length = buf[pos]
+            if length < MIN_FRAME_LEN:
+                pos += 1
+                self.dropped_bytes += 1
+                continue
+            end = pos + length + 1
+            if end > len(buf):
+                break  # wait for the rest of the frame
+            frame = bytes(buf[pos:end])
+            if self.check_crc and crc16(frame[:-CRC_SIZE]) != int.from_bytes(frame[-CRC_SIZE:], 'little'):
+                pos += 1
+                self.dropped_bytes += 1
+                continue
+            frames.append(frame)
+            pos = end
+        del buf[:pos]
+        return frames
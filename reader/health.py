@@ -0,0 +1,36 @@
+import time
+
+from metrics import metrics
+
+
+class ReaderHealth:
+    """What the reader knows about its own state, reported with every heartbeat.
+
+    The serial and pipeline threads update the fields directly; the heartbeat
+    thread and the uploader only read them through ``heartbeat()``. Each
+    field is a single attribute write, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.serial_open = False
+        self.last_frame = None
+        self._uploader = None
+
+    def track_uploads(self, uploader):
+        """Report ``uploader``'s backlog as the upload queue depth."""
+        self._uploader = uploader
+
+    def frame_seen(self, when=None):
+        self.last_frame = when if when is not None else time.time()
+
+    def heartbeat(self):
+        """Status and health fields of a heartbeat request body."""
+        return {
+            'status': 1 if self.serial_open else 0,
+            'health': {
+                'serial_open': self.serial_open,
+                'last_frame': self.last_frame,
+                'upload_queue': self._uploader.pending() if self._uploader else 0,
+                'metrics': metrics.snapshot(),
+            },
+        }
@@ -0,0 +1,83 @@
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """Count, errors and latency percentiles for one kind of operation.
+
+    Percentiles are taken over the last ``window`` samples only.
+    """
+
+    def __init__(self, window=256):
+        self.count = 0
+        self.errors = 0
+        self.last = None
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds, ok=True):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.last = seconds
+        self._samples.append(seconds)
+
+    def snapshot(self):
+        ordered = sorted(self._samples)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'last_ms': round(self.last * 1000, 3) if self.last is not None else None,
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+        }
+
+
+class ReaderMetrics:
+    """Latencies, counters and gauges collected from every reader thread.
+
+    ``snapshot()`` is sent to the server with each heartbeat, which exposes
+    it per gate on its ``/metrics`` endpoint, and printed when the reader
+    exits. Gauges are functions evaluated at snapshot time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, seconds, ok=True):
+        with self._lock:
+            stats = self._latency.get(name)
+            if stats is None:
+                stats = self._latency[name] = LatencyStats()
+            stats.record(seconds, ok)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def gauge(self, name, function):
+        with self._lock:
+            self._gauges[name] = function
+
+    def snapshot(self):
+        with self._lock:
+            latency = {name: stats.snapshot() for name, stats in self._latency.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        return {
+            'latency': latency,
+            'counters': counters,
+            'gauges': {name: function() for name, function in gauges.items()},
+        }
+
+
+# Shared by the whole reader process
+metrics = ReaderMetrics()
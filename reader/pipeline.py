@@ -0,0 +1,63 @@
+import queue
+import threading
+import time
+
+from epc_decoder import decode_epcs
+from framer import FrameParser
+from metrics import metrics
+
+
+def read_serial(ser, raw_queue, stop_event):
+    """Stage 1: block on the serial port and pass raw chunks on as they arrive."""
+    try:
+        while not stop_event.is_set():
+            # Blocks up to the port timeout for the first byte, then takes the rest of the burst
+            chunk = ser.read(ser.in_waiting or 1)
+            if chunk:
+                raw_queue.put((time.time(), chunk))
+    except Exception as e:
+        if not stop_event.is_set():  # closing the port on shutdown also ends up here
+            print(f"Serial read error: {e}")
+        stop_event.set()
+
+
+def decode_frames(raw_queue, tag_queue, stop_event, check_crc=True, health=None, source=None):
+    """Stage 2: split the byte stream into frames and decode an EPC from each."""
+    parser = FrameParser(check_crc=check_crc)
+    while not stop_event.is_set():
+        dropped = parser.dropped_bytes
+        try:
+            read_time, chunk = raw_queue.get(timeout=parser.frame_timeout)
+        except queue.Empty:
+            read_time = time.time()
+            chunk = None
+        start = time.perf_counter()
+        frames = parser.feed(chunk) if chunk is not None else parser.expire()
+        if frames:
+            epcs = decode_epcs(frames)
+            metrics.observe('frame_decode', time.perf_counter() - start)
+            if health is not None:
+                health.frame_seen(read_time)
+            for epc in epcs:
+                if epc:
+                    tag_queue.put((read_time, epc, source))
+        if parser.dropped_bytes != dropped:
+            print(f"Discarded {parser.dropped_bytes - dropped} bytes of unframed serial data")
+
+
+def start_pipeline(ser, check_crc=True, health=None, tag_queue=None, source=None):
+    """Start the read and decode stages for ``ser``.
+
+    Returns the queue of ``(read_time, epc, source)`` tuples for the
+    processing stage and the event that stops the pipeline (also set on a
+    serial error). Pass a shared ``tag_queue`` to merge several ports into one
+    processing stage, with ``source`` telling their tags apart. ``health``, if
+    given, is told the time of every complete frame.
+    """
+    raw_queue = queue.Queue()
+    if tag_queue is None:
+        tag_queue = queue.Queue()
+    stop_event = threading.Event()
+    threading.Thread(target=read_serial, args=(ser, raw_queue, stop_event), daemon=True).start()
+    threading.Thread(target=decode_frames, args=(raw_queue, tag_queue, stop_event, check_crc, health, source), daemon=True).start()
+    return tag_queue, stop_event
@@ -0,0 +1,94 @@
+"""Serial RFID readers driven by one process.
+
+Readers are either discovered (every USB serial port) or listed in a JSON
+config file::
+
+    {
+        "readers": [
+            {"port": "/dev/ttyUSB0", "device_id": "GateA-1"},
+            {"port": "/dev/ttyUSB1", "device_id": "GateA-2", "baud_rate": 115200}
+        ]
+    }
+
+Each reader runs its own read and decode threads and tags every EPC it
+decodes with its ``device_id``, so several antennas can feed one shared
+queue.
+"""
+
+import json
+
+import serial
+from serial.tools import list_ports
+
+from health import ReaderHealth
+from pipeline import start_pipeline
+
+
+def find_serial_ports():
+    """Return every USB serial port, or the first available port if none look like USB."""
+    ports = sorted(list_ports.comports(), key=lambda port: port.device)
+    if not ports:
+        return []
+    usb_ports = []
+    for port in ports:
+        # Print port details for debugging
+        print(f"Found port: {port.device} - {port.description}")
+        if "USB" in port.description.upper():
+            usb_ports.append(port.device)
+    if usb_ports:
+        print(f"Selected USB ports: {', '.join(usb_ports)}")
+        return usb_ports
+    # If no specific USB port found, use the first available port
+    print(f"Selected first available port: {ports[0].device}")
+    return [ports[0].device]
+
+
+def discover_readers(device_id, baud_rate):
+    """One reader per discovered port; several ports are named ``<device_id>-1``, ``-2``, ..."""
+    ports = find_serial_ports()
+    if len(ports) == 1:
+        return [SerialReader(ports[0], device_id, baud_rate)]
+    return [SerialReader(port, f"{device_id}-{i}", baud_rate) for i, port in enumerate(ports, 1)]
+
+
+def load_readers(path, baud_rate):
+    """Readers listed in a JSON config file (see the module docstring)."""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    readers = []
+    for entry in config['readers']:
+        readers.append(SerialReader(entry['port'], entry['device_id'], entry.get('baud_rate', baud_rate)))
+    if len({reader.device_id for reader in readers}) != len(readers):
+        raise ValueError(f"Duplicate device_id in {path}")
+    return readers
+
+
+class SerialReader:
+    """One serial port with its own pipeline threads, device ID and health."""
+
+    def __init__(self, port, device_id, baud_rate):
+        self.port = port
+        self.device_id = device_id
+        self.baud_rate = baud_rate
+        self.health = ReaderHealth()
+        self._serial = None
+        self._stop_event = None
+
+    def open(self, tag_queue, check_crc=True):
+        """Open the port and start putting ``(read_time, epc, device_id)`` on ``tag_queue``."""
+        self._serial = serial.Serial(self.port, self.baud_rate, timeout=1)
+        self.health.serial_open = True
+        _, self._stop_event = start_pipeline(self._serial, check_crc=check_crc, health=self.health,
+                                             tag_queue=tag_queue, source=self.device_id)
+        print(f"Listening for RFID tags on {self.port} as {self.device_id}...")
+
+    @property
+    def running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def close(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._serial is not None:
+            self._serial.close()
+        self.health.serial_open = False
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+
+import requests
+
+from metrics import metrics
+
+EPC_BYTES = 12
+
+
+def _key(epc):
+    # EPCs are held as integers: smaller than hex strings and as fast to hash
+    try:
+        return int(epc, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+class TagRegistry:
+    """Local copy of the server's tag allow/deny registry.
+
+    Tags are kept in two hash sets, so ``status()`` answers in well under a
+    microsecond without touching the network. Snapshots replace both sets in
+    one assignment and changes are applied under a lock, so lookups from the
+    tag loop never wait on a sync in progress.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._allow = set()
+        self._deny = set()
+        self._lock = threading.Lock()
+
+    def status(self, epc):
+        """'allow', 'deny', or None for a tag that is not registered."""
+        key = _key(epc)
+        if key in self._deny:
+            return 'deny'
+        if key in self._allow:
+            return 'allow'
+        return None
+
+    def __len__(self):
+        return len(self._allow) + len(self._deny)
+
+    def load_snapshot(self, data):
+        """Replace the registry with a snapshot in the server's binary format."""
+        header, _, body = data.partition(b'\n')
+        info = json.loads(header)
+        size = info['entry_bytes']
+        if len(body) % size:
+            raise ValueError(f'Truncated registry snapshot ({len(body)} bytes)')
+        allow, deny = set(), set()
+        deny_code = ord('d')
+        for offset in range(0, len(body), size):
+            key = int.from_bytes(body[offset + 1:offset + size], 'big')
+            (deny if body[offset] == deny_code else allow).add(key)
+        with self._lock:
+            self._allow, self._deny = allow, deny
+            self.version = info['version']
+
+    def apply_changes(self, changes, version):
+        """Apply ``[{'tag', 'status'}, ...]`` from /registry/changes, oldest first."""
+        with self._lock:
+            for change in changes:
+                key = _key(change['tag'])
+                if change['status'] == 'allow':
+                    self._allow.add(key)
+                    self._deny.discard(key)
+                elif change['status'] == 'deny':
+                    self._deny.add(key)
+                    self._allow.discard(key)
+                else:
+                    self._allow.discard(key)
+                    self._deny.discard(key)
+            self.version = version
+
+    def snapshot(self):
+        """The registry in the same binary format the server sends."""
+        with self._lock:
+            header = json.dumps({'version': self.version, 'entry_bytes': 1 + EPC_BYTES}).encode('utf-8')
+            entries = [b'a' + key.to_bytes(EPC_BYTES, 'big') for key in self._allow]
+            entries += [b'd' + key.to_bytes(EPC_BYTES, 'big') for key in self._deny]
+        return header + b'\n' + b''.join(entries)
+
+
+class RegistrySync:
+    """Keep a ``TagRegistry`` current with the server.
+
+    A reader with no local copy downloads the full snapshot once; after that
+    it polls for the changes since the version it holds every ``interval``
+    seconds. The registry is saved to ``cache_path`` after every change, so
+    the gate starts with its last known registry even if the server cannot
+    be reached.
+    """
+
+    def __init__(self, registry, client, base_url, cache_path=None, interval=30):
+        self.registry = registry
+        self.client = client
+        self.base_url = base_url.rstrip('/')
+        self.cache_path = cache_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        metrics.gauge('registry_version', lambda: registry.version)
+        metrics.gauge('registry_tags', lambda: len(registry))
+
+    def start(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'rb') as f:
+                    self.registry.load_snapshot(f.read())
+                print(f"Loaded {len(self.registry)} registry tags (version {self.registry.version}) from {self.cache_path}")
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable registry cache {self.cache_path}: {e}")
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def sync(self):
+        """Bring the registry up to date; return True if anything changed."""
+        before = self.registry.version
+        if before == 0:
+            self._fetch_snapshot()
+        else:
+            while True:
+                response = self.client.get(f'{self.base_url}/registry/changes', params={'since': self.registry.version})
+                if response.status_code == 410:
+                    # The server's registry was reset; start again from a snapshot
+                    self._fetch_snapshot()
+                    break
+                response.raise_for_status()
+                data = response.json()
+                self.registry.apply_changes(data['changes'], data['version'])
+                if not data['has_more']:
+                    break
+        changed = self.registry.version != before
+        if changed:
+            self._save()
+        return changed
+
+    def _fetch_snapshot(self):
+        response = self.client.get(f'{self.base_url}/registry/snapshot')
+        response.raise_for_status()
+        self.registry.load_snapshot(response.content)
+        print(f"Downloaded registry snapshot: {len(self.registry)} tags, version {self.registry.version}")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.registry.snapshot())
+        os.replace(tmp_path, self.cache_path)
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Registry sync failed, keeping version {self.registry.version}: {e}")
+            if self._stop.wait(self.interval):
+                return
@@ -1,9 +1,9 @@
 import serial  
 import time  
-import pygame  # Import pygame for sound playback  
-import requests  # Import requests to send HTTP requests  
 from datetime import datetime  
 from serial.tools import list_ports  
+from epc_decoder import to_hex, split_hex
+from api_client import ApiClient
   
 # Configure the baud rate  
 BAUD_RATE = 57600  # Change this to your RFID reader's baud rate  
@@ -15,6 +15,9 @@ ALARM_SOUND = 'alarm_sound.mp3'  # Change this to your audio file path
 # API_URL = 'http://localhost:5000/receive'  # Change this if your API is hosted elsewhere  
 API_URL = 'https://iqosgate.theorca.id/receive'  # Change this if your API is hosted elsewhere
 
+# Shared keep-alive HTTP session with timeouts for all API calls
+api = ApiClient()
+
 def find_serial_port():  
     ports = list_ports.comports()  
     for port in ports:  
@@ -24,6 +27,7 @@ def find_serial_port():
     return None  
   
 def ring_alarm():  
+    import pygame  # Imported on the first alarm, so startup does not wait for SDL  
     pygame.mixer.init()  # Initialize the mixer  
     pygame.mixer.music.load(ALARM_SOUND)  # Load the sound file  
     pygame.mixer.music.play()  # Play the sound  
@@ -31,7 +35,7 @@ def ring_alarm():
 def send_tag_to_api(tag_str):  
     try:  
         timestamp = datetime.utcnow().isoformat() + 'Z'  # UTC ISO 8601 format  
-        response = requests.post(API_URL, json={'string': tag_str, 'timestamp': timestamp})  
+        response = api.post_json(API_URL, {'string': tag_str, 'timestamp': timestamp})  
         if response.status_code == 200:  
             print(f"Successfully sent tag to API: {tag_str} at {timestamp}")  
         else:  
@@ -62,12 +66,10 @@ def main():
                     rfid_tag = ser.read(ser.in_waiting)  # Read raw bytes  
                     print(f"Raw Data Detected: {rfid_tag}")  # Print raw data  
                     # Convert to hex string for sending  
-                    tag_str = ''.join(format(x, '02x') for x in rfid_tag)  
+                    tag_str = to_hex(rfid_tag)  
                     print(f"Hex Data: {tag_str}")  
                     # Split hex string into chunks of 16 characters (8 bytes)  
-                    chunk_size = 16  
-                    for i in range(0, len(tag_str), chunk_size):  
-                        chunk = tag_str[i:i+chunk_size]  
+                    for chunk in split_hex(tag_str, 16):  
                         if chunk and chunk not in sent_tags:  
                             print(f"Sending new EPC chunk: {chunk}")  
                             ring_alarm()  # Ring the alarm  
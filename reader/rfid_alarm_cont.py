@@ -1,9 +1,9 @@
 import serial  
 import time  
-import pygame  # Import pygame for sound playback  
-import requests  # Import requests to send HTTP requests  
 from datetime import datetime  
 from serial.tools import list_ports  
+from epc_decoder import to_hex, split_hex
+from api_client import ApiClient
 import threading  
   
 # Configure the baud rate  
@@ -22,6 +22,9 @@ GATE_STATUS_API_URL = 'https://iqosgate.theorca.id/gate_status'  # Change if nee
 # Device identifier for this Raspberry Pi
 DEVICE_ID = "GateA"  # Change this to "GateB" or other as needed
 
+# Shared keep-alive HTTP session with timeouts for all API calls
+api = ApiClient()
+
 def find_serial_port():  
     ports = list_ports.comports()  
     for port in ports:  
@@ -31,6 +34,7 @@ def find_serial_port():
     return None  
  
 def ring_alarm():  
+    import pygame  # Imported on the first alarm, so startup does not wait for SDL  
     pygame.mixer.init()  # Initialize the mixer  
     pygame.mixer.music.load(ALARM_SOUND)  # Load the sound file  
     pygame.mixer.music.play()  # Play the sound  
@@ -38,7 +42,7 @@ def ring_alarm():
 def send_tag_to_api(tag_str):  
     try:  
         timestamp = datetime.utcnow().isoformat() + 'Z'  # UTC ISO 8601 format  
-        response = requests.post(API_URL, json={'string': tag_str, 'timestamp': timestamp, 'device': DEVICE_ID})  
+        response = api.post_json(API_URL, {'string': tag_str, 'timestamp': timestamp, 'device': DEVICE_ID})  
         if response.status_code == 200:  
             print(f"Successfully sent tag to API: {tag_str} at {timestamp} from {DEVICE_ID}")  
         else:  
@@ -48,7 +52,7 @@ def send_tag_to_api(tag_str):
 
 def send_gate_status_to_api(status):  
     try:  
-        response = requests.post(GATE_STATUS_API_URL, json={'gate_id': DEVICE_ID, 'status': status})  
+        response = api.post_json(GATE_STATUS_API_URL, {'gate_id': DEVICE_ID, 'status': status})  
         if response.status_code == 200:  
             print(f"Successfully sent gate status {status} for {DEVICE_ID}")  
         else:  
@@ -82,12 +86,10 @@ def main():
                     rfid_tag = ser.read(ser.in_waiting)  # Read raw bytes  
                     print(f"Raw Data Detected: {rfid_tag}")  # Print raw data  
                     # Convert to hex string for sending  
-                    tag_str = ''.join(format(x, '02x') for x in rfid_tag)  
+                    tag_str = to_hex(rfid_tag)  
                     print(f"Hex Data: {tag_str}")  
                     # Split hex string into chunks of 16 characters (8 bytes)  
-                    chunk_size = 16  
-                    for i in range(0, len(tag_str), chunk_size):  
-                        chunk = tag_str[i:i+chunk_size]  
+                    for chunk in split_hex(tag_str, 16):  
                         if chunk:  
                             print(f"Sending EPC chunk: {chunk}")  
                             ring_alarm()  # Ring the alarm  
@@ -1,142 +1,182 @@
-import serial  
 import time  
-import pygame  # Import pygame for sound playback  
-import requests  # Import requests to send HTTP requests  
-from datetime import datetime  
-from serial.tools import list_ports  
 import threading  
+import argparse
+import queue
+from alarm import AlarmService
+from api_client import ApiClient
+from dedup import DedupCache
+from metrics import metrics
+from readers import discover_readers, load_readers
+from registry import RegistrySync, TagRegistry
+from spool import Spool
+from uploader import BatchUploader
   
 # Configure the baud rate  
 BAUD_RATE = 57600  # Change this to your RFID reader's baud rate  
+
+# Drop frames whose CRC-16 does not match; set to False if your reader sends no CRC
+CHECK_CRC = True
+
+# Duplicate suppression: seconds a tag must be absent before it counts as new again,
+# and the most tags remembered at once
+DEDUP_TTL = 60
+DEDUP_MAX_TAGS = 10000
   
 # Path to your custom alarm sound  
 ALARM_SOUND = 'alarm_sound.mp3'  # Change this to your audio file path  
+
+# SDL audio driver for the alarm; None picks the default, 'dummy' plays silently (headless testing)
+AUDIO_DRIVER = None
   
-# API endpoint to send RFID tags  
-#API_URL = 'http://localhost:5000/receive'  # Change this if your API is hosted elsewhere  
-API_URL = 'https://iqosgate.theorca.id/receive'  # Change this if your API is hosted elsewhere
+# API endpoint to send RFID tags in batches; reads are grouped by size or time  
+#BATCH_API_URL = 'http://localhost:5000/receive/batch'  # Change this if your API is hosted elsewhere  
+BATCH_API_URL = 'https://iqosgate.theorca.id/receive/batch'  # Change this if your API is hosted elsewhere
+UPLOAD_BATCH_SIZE = 50  # send as soon as this many tags are waiting
+UPLOAD_MAX_DELAY = 1.0  # or after this many seconds, whichever comes first
 
-# API endpoint to send gate status
-GATE_STATUS_API_URL = 'https://iqosgate.theorca.id/gate_status'  # Change if needed
-#GATE_STATUS_API_URL = 'http://localhost:5000/gate_status'  # Change if needed
+# Tags waiting to be uploaded are kept here so nothing is lost while offline
+SPOOL_PATH = 'upload_spool.db'  # Change this to your spool file path
 
-# Device identifier for this Raspberry Pi
-DEVICE_ID = "GateA"  # Change this to "GateB" or other as needed
+# API endpoint for heartbeats (gate status and reader health)
+HEARTBEAT_API_URL = 'https://iqosgate.theorca.id/heartbeat'  # Change if needed
+#HEARTBEAT_API_URL = 'http://localhost:5000/heartbeat'  # Change if needed
+HEARTBEAT_INTERVAL = 30  # seconds; skipped while tag uploads are carrying the heartbeat
 
-def find_serial_port():
-    """Find the first available serial port."""
-    ports = list_ports.comports()
-    if not ports:
-        return None
-        
-    # Try to find a port with RFID reader characteristics
-    for port in ports:
-        # Print port details for debugging
-        print(f"Found port: {port.device} - {port.description}")
-        if "USB" in port.description.upper():
-            print(f"Selected USB port: {port.device}")
-            return port.device
-            
-    # If no specific USB port found, return the first available port
-    print(f"Selected first available port: {ports[0].device}")
-    return ports[0].device
-  
-def ring_alarm():  
-    pygame.mixer.init()  # Initialize the mixer  
-    pygame.mixer.music.load(ALARM_SOUND)  # Load the sound file  
-    pygame.mixer.music.play()  # Play the sound  
-  
-def send_tag_to_api(tag_str):  
-    try:  
-        timestamp = datetime.utcnow().isoformat() + 'Z'  # UTC ISO 8601 format  
-        response = requests.post(API_URL, json={'string': tag_str, 'timestamp': timestamp, 'device': DEVICE_ID})  
-        if response.status_code == 200:  
-            print(f"Successfully sent tag to API: {tag_str} at {timestamp} from {DEVICE_ID}")  
-        else:  
-            print(f"Failed to send tag to API: {response.status_code} {response.text}")  
-    except Exception as e:  
-        print(f"Error sending tag to API: {e}")  
+# Server holding the tag allow/deny registry; a local copy is kept in sync and cached on disk
+REGISTRY_API_URL = 'https://iqosgate.theorca.id'  # Change if needed
+#REGISTRY_API_URL = 'http://localhost:5000'  # Change if needed
+REGISTRY_CACHE_PATH = 'tag_registry.bin'
+REGISTRY_SYNC_INTERVAL = 30  # seconds between checks for registry changes
 
-def send_gate_status_to_api(status):  
+# Allowed tags never ring the alarm and denied tags always do; this decides tags in neither list
+ALARM_UNREGISTERED = True
+
+# Device identifier for this Raspberry Pi; with several discovered ports they become GateA-1, GateA-2, ...
+DEVICE_ID = "GateA"  # Change this to "GateB" or other as needed
+
+def send_gate_status_to_api(client, reader):  
     try:  
-        response = requests.post(GATE_STATUS_API_URL, json={'gate_id': DEVICE_ID, 'status': status})  
-        if response.status_code == 200:  
-            print(f"Successfully sent gate status {status} for {DEVICE_ID}")  
-        else:  
+        body = {'gate_id': reader.device_id, **reader.health.heartbeat()}
+        response = client.post_json(HEARTBEAT_API_URL, body, compress=False)  
+        if response.status_code not in (200, 204):  
             print(f"Failed to send gate status: {response.status_code} {response.text}")  
     except Exception as e:  
         print(f"Error sending gate status: {e}")  
 
-def periodic_gate_status_update(interval=60):  
-    status = 1  # Hardcoded online status, can be updated with real logic  
-    # Send initial online status immediately on start
-    send_gate_status_to_api(status)
+def periodic_gate_status_update(client, readers, uploader, interval=HEARTBEAT_INTERVAL):  
+    # Send initial status immediately on start
+    for reader in readers:
+        send_gate_status_to_api(client, reader)
     while True:  
         time.sleep(interval)  
-        send_gate_status_to_api(status)  
+        # A successful upload already told the server we are alive
+        if uploader.health is None or time.time() - uploader.last_upload >= interval:
+            for reader in readers:
+                send_gate_status_to_api(client, reader)  
+
+def should_alarm(status):
+    if status is None:
+        return ALARM_UNREGISTERED
+    return status == 'deny'
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RFID gate reader")
+    parser.add_argument('--audio-driver', default=AUDIO_DRIVER,
+                        help="SDL audio driver for the alarm, e.g. 'dummy' to run headless")
+    parser.add_argument('--no-audio', action='store_true',
+                        help="never load the audio backend; alarms are only logged and counted")
+    parser.add_argument('--config',
+                        help="JSON file listing the serial ports and their device IDs; "
+                             "by default every USB serial port is used")
+    return parser.parse_args()
 
 def main():  
-    serial_port = find_serial_port()  
-    if not serial_port:  
+    args = parse_args()
+    if args.config:
+        readers = load_readers(args.config, BAUD_RATE)
+    else:
+        readers = discover_readers(DEVICE_ID, BAUD_RATE)
+    if not readers:  
         print("No serial port found. Please connect your RFID reader.")  
         return  
   
-    # Start the periodic gate status update in a separate thread  
-    threading.Thread(target=periodic_gate_status_update, daemon=True).start()  
+    # One keep-alive session for uploads and heartbeats, so each is a single round trip
+    client = ApiClient(compress=True)
+  
+    # Uploads run in the background so the serial loop never waits on the network;
+    # anything left in the spool from a previous run is replayed first. With a single
+    # reader its heartbeat rides along with every batch.
+    spool = Spool(SPOOL_PATH)
+    uploader = BatchUploader(BATCH_API_URL, readers[0].device_id, spool, max_batch=UPLOAD_BATCH_SIZE,
+                             max_delay=UPLOAD_MAX_DELAY, client=client,
+                             health=readers[0].health if len(readers) == 1 else None)
+    for reader in readers:
+        reader.health.track_uploads(uploader)
+  
+    # Alarm decisions are looked up in a local copy of the registry, never over the network
+    registry = TagRegistry()
+    registry_sync = RegistrySync(registry, client, REGISTRY_API_URL, cache_path=REGISTRY_CACHE_PATH,
+                                 interval=REGISTRY_SYNC_INTERVAL)
+    registry_sync.start()
+  
+    # The sound is loaded by the first alarm, not at startup; alarms play from their own thread
+    alarm = AlarmService(ALARM_SOUND, driver=args.audio_driver, enabled=not args.no_audio)
   
-    sent_tags = set()  
-    last_clear_time = time.time()  
-    CLEAR_INTERVAL = 60  # seconds to clear sent tags set  
+    # Shared by every antenna: a tag is sent again only after it has been out of range
+    # of all of them for DEDUP_TTL seconds
+    recent_tags = DedupCache(ttl=DEDUP_TTL, max_size=DEDUP_MAX_TAGS)
+    tag_queue = queue.Queue()
+    metrics.gauge('tag_queue', tag_queue.qsize)
+    metrics.gauge('upload_queue', uploader.pending)
     try:  
-        # Open the serial port  
-        with serial.Serial(serial_port, BAUD_RATE, timeout=1) as ser:  
-            print(f"Listening for RFID tags on {serial_port}...")  
-            while True:  
-                current_time = time.time()  
-                if current_time - last_clear_time > CLEAR_INTERVAL:  
-                    sent_tags.clear()  
-                    last_clear_time = current_time  
-                    print("Cleared sent tags set.")  
-                if ser.in_waiting > 0:  
-                    rfid_tag = ser.read(ser.in_waiting)  # Read raw bytes  
-                    print(f"Raw Data Detected: {rfid_tag}")  # Print raw data  
-                    # Convert to hex string without spaces
-                    tag_str = ''.join(format(x, '02x') for x in rfid_tag)
-                    print(f"Raw Hex Data: {tag_str}")
-                    
-                    # Process the tag - remove first 4 bytes and last 2 bytes
-                    hex_clean = tag_str[8:-4]  # Remove first 4 bytes (8 chars) and last 2 bytes (4 chars)
-                    
-                    # Take only first 24 characters (8 groups of 3 chars) and process into 12-bit chunks
-                    hex_clean = hex_clean[:24]  # Limit to 24 characters
-                    processed_chunks = []
-                    for i in range(0, len(hex_clean), 3):
-                        chunk = hex_clean[i:i+3]
-                        if len(chunk) == 3:  # Only process complete 3-char chunks
-                            processed_chunks.append(chunk)
-                        if len(processed_chunks) == 8:  # Stop after 8 chunks
-                            break
-                            
-                    # Join only the first 8 chunks with spaces
-                    processed_tag = ' '.join(processed_chunks[:8])
-                    print(f"Processed Hex Data (8 chunks of 12 bits): {processed_tag}")
-                    
-                    # Remove spaces for sending
-                    processed_tag_no_spaces = ''.join(processed_chunks[:8])
-                    
-                    # Process the tag if it's not empty and hasn't been sent
-                    if processed_tag_no_spaces and processed_tag_no_spaces not in sent_tags:
-                        print(f"Sending new EPC tag: {processed_tag_no_spaces}")  
-                        ring_alarm()  # Ring the alarm  
-                        send_tag_to_api(processed_tag_no_spaces)  # Send tag to API  
-                        sent_tags.add(processed_tag_no_spaces)  
-                        time.sleep(1)  # Delay to avoid multiple alarms for the same tag  
-                else:  
-                    time.sleep(0.1)  
+        # Each port gets its own read and decode threads, all feeding tag_queue;
+        # this loop only handles decoded tags
+        for reader in readers:
+            try:
+                reader.open(tag_queue, check_crc=CHECK_CRC)
+            except Exception as e:
+                print(f"Could not open {reader.port} for {reader.device_id}: {e}")
+        # Start the periodic gate status update in a separate thread  
+        threading.Thread(target=periodic_gate_status_update, args=(client, readers, uploader), daemon=True).start()  
+        running = [reader for reader in readers if reader.running]
+        while running:  
+            try:
+                read_time, epc, device_id = tag_queue.get(timeout=0.5)
+            except queue.Empty:
+                pass
+            else:
+                # Process the tag if it hasn't been seen recently
+                if not recent_tags.seen(epc, read_time):
+                    status = registry.status(epc)
+                    print(f"Sending new EPC tag: {epc} from {device_id} ({status or 'unregistered'})")  
+                    if should_alarm(status):
+                        alarm.trigger()  # Ring the alarm  
+                    uploader.submit(epc, read_time, device=device_id)  # Queue tag for upload  
+            for reader in [reader for reader in running if not reader.running]:
+                # Report a lost port right away; the other antennas keep going
+                print(f"Reader {reader.device_id} on {reader.port} stopped")
+                reader.close()
+                send_gate_status_to_api(client, reader)
+                running.remove(reader)
     except KeyboardInterrupt:  
         print("Program terminated.")  
     except Exception as e:  
         print(f"Error: {e}")  
+    finally:
+        # Tell the server right away instead of letting the heartbeat time out
+        for reader in readers:
+            reader.close()
+            send_gate_status_to_api(client, reader)
+        uploader.close(timeout=30)  # Spool whatever is still queued and try to send it
+        latency = dict(metrics.snapshot()['latency'], **client.latency())
+        for name, stats in latency.items():
+            print(f"{name}: {stats['count']} samples, {stats['errors']} errors, "
+                  f"p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms")
+        print(f"Counters: {metrics.snapshot()['counters']}")
+        registry_sync.close()
+        client.close()
+        spool.close()
+        alarm.close()
   
 if __name__ == "__main__":  
     main()
@@ -0,0 +1,59 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class Spool:
+    """Disk-backed FIFO of events waiting to be uploaded.
+
+    Rows survive restarts and power loss, so reads taken while the network is
+    down are replayed in the order they were made once it comes back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' created REAL NOT NULL,'
+            ' payload TEXT NOT NULL)'
+        )
+
+    def put_many(self, events):
+        now = time.time()
+        rows = [(now, json.dumps(event)) for event in events]
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany('INSERT INTO spool (created, payload) VALUES (?, ?)', rows)
+            self._conn.execute('COMMIT')
+
+    def peek(self, limit):
+        """Return up to ``limit`` of the oldest rows as ``(id, event)`` pairs."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, payload FROM spool ORDER BY id LIMIT ?', (limit,)
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, last_id):
+        """Remove every row up to and including ``last_id``."""
+        with self._lock:
+            self._conn.execute('DELETE FROM spool WHERE id <= ?', (last_id,))
+
+    def oldest_created(self):
+        with self._lock:
+            row = self._conn.execute('SELECT created FROM spool ORDER BY id LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
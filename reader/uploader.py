@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from api_client import ApiClient
+from metrics import metrics
+
+_STOP = object()
+
+
+def _read_time(event):
+    # Events carry their serial read time as UTC ISO 8601 with a trailing Z
+    return datetime.fromisoformat(event['timestamp'][:-1]).replace(tzinfo=timezone.utc).timestamp()
+
+
+# Server answers that are worth retrying; any other 4xx means the batch itself is bad
+RETRYABLE_STATUS = {408, 429}
+
+
+class BatchUploader:
+    """Store-and-forward uploader for tag reads.
+
+    ``submit()`` only puts the read on an in-memory queue, so the serial loop
+    never waits on the disk or the network. A background thread moves queued
+    reads into the on-disk spool and posts them to the server's batch endpoint
+    once ``max_batch`` events are waiting or the oldest has waited
+    ``max_delay`` seconds. Failed uploads stay in the spool and are retried in
+    order with exponential backoff capped at ``max_backoff``; a batch the
+    server keeps rejecting as malformed is dropped after ``max_rejects`` tries.
+
+    Batches go through ``client``, a shared ``ApiClient``; one with gzip
+    compression is created if none is given.
+
+    With ``health`` set, each batch also carries the reader's heartbeat, so
+    the server needs no separate heartbeat while tags are being uploaded.
+    """
+
+    def __init__(self, url, device_id, spool, max_batch=50, max_delay=1.0, client=None,
+                 initial_backoff=1.0, max_backoff=60.0, max_rejects=3, health=None):
+        self.url = url
+        self.device_id = device_id
+        self.spool = spool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.client = client if client is not None else ApiClient(compress=True)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_rejects = max_rejects
+        self.health = health
+        self.last_upload = 0  # time of the last successful upload
+        self._queue = queue.Queue()
+        self._stopping = False
+        self._backoff = 0
+        self._retry_at = 0
+        self._rejects = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, tag_str, read_time=None, device=None):
+        """Queue a read; ``device`` overrides ``device_id`` for readers with several antennas."""
+        if read_time is None:
+            read_time = time.time()
+        timestamp = datetime.utcfromtimestamp(read_time).isoformat() + 'Z'  # UTC ISO 8601 format
+        self._queue.put({'string': tag_str, 'timestamp': timestamp, 'device': device or self.device_id})
+
+    def pending(self):
+        """Number of reads not yet accepted by the server."""
+        return self._queue.qsize() + len(self.spool)
+
+    def close(self, timeout=None):
+        """Spool anything still queued, try one last upload and stop."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _wait_timeout(self):
+        now = time.time()
+        if self._retry_at > now:
+            return self._retry_at - now
+        oldest = self.spool.oldest_created()
+        if oldest is None:
+            return None
+        return max(oldest + self.max_delay - now, 0)
+
+    def _spool_queued(self, timeout):
+        """Move queued reads into the spool, waiting up to ``timeout`` for the first."""
+        events = []
+        try:
+            item = self._queue.get(timeout=timeout) if timeout != 0 else self._queue.get_nowait()
+            while True:
+                if item is _STOP:
+                    self._stopping = True
+                else:
+                    events.append(item)
+                item = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if events:
+            self.spool.put_many(events)
+
+    def _ready(self):
+        if self._stopping:
+            return True
+        if time.time() < self._retry_at:
+            return False
+        if len(self.spool) >= self.max_batch:
+            return True
+        oldest = self.spool.oldest_created()
+        return oldest is not None and time.time() - oldest >= self.max_delay
+
+    def _run(self):
+        while True:
+            self._spool_queued(self._wait_timeout())
+            if self._ready():
+                # Drain full batches; a partial one waits for more reads unless stopping
+                while True:
+                    rows = self.spool.peek(self.max_batch)
+                    if not rows or not self._upload(rows):
+                        break
+                    if not self._stopping and len(rows) < self.max_batch:
+                        break
+            if self._stopping:
+                return
+
+    def _upload(self, rows):
+        """Send one batch from the spool; return True if it left the spool."""
+        batch = [event for _, event in rows]
+        status = self._send(batch)
+        if status == 200:
+            self.spool.ack(rows[-1][0])
+            self.last_upload = time.time()
+            metrics.increment('tags_uploaded', len(batch))
+            metrics.observe('serial_to_upload', self.last_upload - _read_time(batch[0]))
+            self._backoff = 0
+            self._retry_at = 0
+            self._rejects = 0
+            return True
+        if status is not None and 400 <= status < 500 and status not in RETRYABLE_STATUS:
+            self._rejects += 1
+            if self._rejects >= self.max_rejects:
+                print(f"Dropping {len(batch)} tags rejected {self._rejects} times by the API")
+                metrics.increment('tags_dropped', len(batch))
+                self.spool.ack(rows[-1][0])
+                self._rejects = 0
+                return True
+        metrics.increment('upload_retries')
+        self._backoff = min(self._backoff * 2 or self.initial_backoff, self.max_backoff)
+        self._retry_at = time.time() + self._backoff
+        print(f"Upload failed, {len(self.spool)} tags spooled, retrying in {self._backoff:.1f}s")
+        return False
+
+    def _send(self, batch):
+        """Post a batch and return the HTTP status, or None if the request failed."""
+        payload = batch
+        if self.health is not None:
+            payload = {'device': self.device_id, 'events': batch}
+            payload.update(self.health.heartbeat())
+        try:
+            response = self.client.post_json(self.url, payload)
+            if response.status_code == 200:
+                print(f"Successfully sent {len(batch)} tags to API from {self.device_id}")
+            else:
+                print(f"Failed to send tags to API: {response.status_code} {response.text}")
+            return response.status_code
+        except Exception as e:
+            print(f"Error sending tags to API: {e}")
+            return None
@@ -1,9 +1,14 @@
+import os
+import sys
 import serial  
 import time  
-import pygame  # Import pygame for sound playback  
-import requests  # Import requests to send HTTP requests  
 from datetime import datetime  
 from serial.tools import list_ports  
+
+# The shared reader modules import each other by name, as the scripts in reader/ do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reader'))
+from epc_decoder import to_hex
+from api_client import ApiClient
   
 # Configure the baud rate  
 BAUD_RATE = 9600  # Change this to your RFID reader's baud rate  
@@ -14,6 +19,9 @@ ALARM_SOUND = 'alarm_sound.mp3'  # Change this to your audio file path
 # API endpoint to send RFID tags  
 API_URL = 'http://localhost:5000/receive'  # Change this if your API is hosted elsewhere  
   
+# Shared keep-alive HTTP session with timeouts for all API calls
+api = ApiClient()
+
 def find_serial_port():  
     ports = list_ports.comports()  
     for port in ports:  
@@ -23,6 +31,7 @@ def find_serial_port():
     return None  
   
 def ring_alarm():  
+    import pygame  # Imported on the first alarm, so startup does not wait for SDL  
     pygame.mixer.init()  # Initialize the mixer  
     pygame.mixer.music.load(ALARM_SOUND)  # Load the sound file  
     pygame.mixer.music.play()  # Play the sound  
@@ -30,7 +39,7 @@ def ring_alarm():
 def send_tag_to_api(tag_str):  
     try:  
         timestamp = datetime.utcnow().isoformat() + 'Z'  # UTC ISO 8601 format  
-        response = requests.post(API_URL, json={'string': tag_str, 'timestamp': timestamp})  
+        response = api.post_json(API_URL, {'string': tag_str, 'timestamp': timestamp})  
         if response.status_code == 200:  
             print(f"Successfully sent tag to API: {tag_str} at {timestamp}")  
         else:  
@@ -53,7 +62,7 @@ def main():
                     rfid_tag = ser.read(ser.in_waiting)  # Read raw bytes  
                     print(f"Raw Data Detected: {rfid_tag}")  # Print raw data  
                     # Convert to hex string for sending  
-                    tag_str = ''.join(format(x, '02x') for x in rfid_tag)  
+                    tag_str = to_hex(rfid_tag)  
                     print(f"Hex Data: {tag_str}")  
                     ring_alarm()  # Ring the alarm  
                     send_tag_to_api(tag_str)  # Send tag to API  
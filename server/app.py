@@ -1,10 +1,21 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 import os
 import json
 from datetime import datetime, timezone, timedelta
 from flask_cors import CORS
 import logging
+import math
+import queue
+import threading
 import time
+import zlib
+from archive import EventArchive, retention_cutoff
+from broadcaster import Broadcaster
+from export import FORMATS as EXPORT_FORMATS, parquet_available
+from liveness import LivenessTracker
+from prom_metrics import Gauge, Registry
+from repository import EventRepository
+from tag_registry import STATUSES as REGISTRY_STATUSES, normalize_epc, snapshot_chunks
 
 app = Flask(__name__)
 CORS(app)
@@ -13,96 +24,640 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# File to store the data
-DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rfid_data.json')
-logger.info(f"Using data file: {DATA_FILE}")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load existing data or initialize empty list
-def load_data():
+# Shared SQLite database (WAL mode); safe for several worker processes
+DB_FILE = os.environ.get('IQOSGATE_DB', os.path.join(BASE_DIR, 'rfid_data.db'))
+logger.info(f"Using database: {DB_FILE}")
+
+# Older storage format, imported into the database on first start
+DATA_FILE = os.path.join(BASE_DIR, 'rfid_data.json')
+
+# Opened on first use, so importing the app touches no database file
+repository = EventRepository(DB_FILE)
+
+# Events older than the retention period are moved here as gzip-compressed daily segments
+ARCHIVE_DIR = os.environ.get('IQOSGATE_ARCHIVE_DIR', os.path.join(BASE_DIR, 'rfid_archive'))
+archive = EventArchive(ARCHIVE_DIR)
+
+# How long one worker may spend migrating before another one may try
+MIGRATION_LEASE_SECONDS = 600
+
+# Recorded in the database once rfid_data.json has been imported
+LEGACY_MIGRATION = 'rfid_data.json'
+
+# Import history from the old rfid_data.json once
+def migrate_legacy_data():
+    if not os.path.exists(DATA_FILE):
+        return
     try:
-        if os.path.exists(DATA_FILE):
+        # One worker migrates; the others wait here, before serving their first
+        # request, so nothing new is ingested ahead of the history
+        while not repository.acquire_lease('legacy_migration', MIGRATION_LEASE_SECONDS):
+            time.sleep(1)
+        if not os.path.exists(DATA_FILE):
+            return  # migrated by another worker while this one waited
+        count = None
+        if not repository.migration_applied(LEGACY_MIGRATION):
             with open(DATA_FILE, 'r') as f:
-                return json.load(f)
-        return []
+                legacy = json.load(f)
+            count = repository.import_records(LEGACY_MIGRATION, legacy)
+        if count is None:
+            logger.warning(f"Not importing {DATA_FILE}: it was migrated before; move or delete the file")
+            return
+        os.replace(DATA_FILE, DATA_FILE + '.migrated')
+        logger.info(f"Migrated {count} records from {DATA_FILE}")
     except Exception as e:
-        print(f"Error loading data: {e}")
-        return []
+        logger.error(f"Error migrating legacy data from {DATA_FILE}: {e}")
+    finally:
+        repository.release_lease('legacy_migration')
 
-# Save data to file
-def save_data(data):
-    try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving data: {e}")
+# Upper bound for a single page of /strings
+MAX_PAGE_SIZE = 1000
+
+# Limits for POST /receive/batch, applied to the body as sent and after gzip decoding
+MAX_BATCH_EVENTS = 1000
+MAX_BATCH_BYTES = 1024 * 1024
+
+# Largest request body any endpoint accepts (a full POST /registry update is the biggest)
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': 'Request body is too large'}), 413
+
+# The same tag seen again within this many seconds, by any gate, is merged into
+# the first event instead of being stored again
+DEDUP_WINDOW_SECONDS = 10
+
+# Fans new tag events and gate status changes out to /stream subscribers
+broadcaster = Broadcaster()
 
-# Initialize data from file
-received_strings = load_data()
+# Comment line sent on idle streams so proxies keep the connection open
+STREAM_KEEPALIVE_SECONDS = 15
 
-# In-memory storage for gate statuses with last update timestamp
-gate_statuses = {}
+# How often each process checks the database for changes made by other workers
+STREAM_POLL_SECONDS = 0.5
 
-TIMEOUT_SECONDS = 120  # 2 minutes timeout for offline detection
+# Metrics of this process for GET /metrics; with several gunicorn workers each
+# scrape sees the worker that answered it
+metrics = Registry()
+request_seconds = metrics.histogram(
+    'iqosgate_http_request_seconds', 'Time to handle an HTTP request', ['endpoint', 'method', 'status'])
+storage_seconds = metrics.histogram(
+    'iqosgate_storage_seconds', 'Time spent in database and archive calls', ['operation'])
+serialization_seconds = metrics.histogram(
+    'iqosgate_serialization_seconds', 'Time spent decoding request bodies and encoding responses', ['operation'])
+events_stored = metrics.counter('iqosgate_events_stored', 'Tag events stored', ['device'])
+events_merged = metrics.counter('iqosgate_events_merged', 'Tag events merged into a recent duplicate', ['device'])
+heartbeats = metrics.counter('iqosgate_heartbeats', 'Heartbeats received, including tag uploads', ['gate'])
+metrics.gauge('iqosgate_stream_subscribers', 'Open /stream connections in this process',
+              function=lambda: len(broadcaster))
+
+TIMEOUT_SECONDS = 120  # 2 minutes without a heartbeat and a gate is marked offline
+
+# Number of UTC days (including today) kept in the database; 0 keeps everything
+RETENTION_DAYS = int(os.environ.get('IQOSGATE_RETENTION_DAYS', 30))
+
+# How often the compaction job looks for events to archive
+COMPACT_INTERVAL_SECONDS = 3600
+
+# Events fetched from the database per query while streaming an /export
+EXPORT_PAGE_SIZE = 5000
+
+# Window used by the /stats endpoints when no ?start= is given
+STATS_DEFAULT_WINDOW = 24 * 3600
+
+# Limits for the tag registry: entries per POST /registry, changes per page of /registry/changes
+MAX_REGISTRY_UPDATE = 100000
+MAX_REGISTRY_CHANGES = 10000
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.observe(time.perf_counter() - start, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+    return response
 
 @app.route('/')
 def serve_index():
-    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+    return send_from_directory(BASE_DIR, 'index.html')
+
+def parse_iso_timestamp(iso_timestamp):
+    return datetime.fromisoformat(iso_timestamp.replace('Z', '+00:00')).timestamp()
+
+def event_time(data):
+    # The reader's own read time (UTC epoch), so replayed uploads keep their real time
+    try:
+        return parse_iso_timestamp(data['timestamp'])
+    except Exception:
+        return time.time()
+
+def store_events(events):
+    """Store request events in one transaction, merging recent duplicates."""
+    records = [build_record(item) for item in events]
+    with storage_seconds.time(operation='append'):
+        stored = repository.append_many(records, dedup_window=DEDUP_WINDOW_SECONDS)
+    count_events(records, stored)
+    if stored:
+        announce_changes()
+    return stored
+
+def count_events(records, stored):
+    received = {}
+    for record in records:
+        device = record.get('device', '')
+        received[device] = received.get(device, 0) + 1
+    for record in stored:
+        received[record.get('device', '')] -= 1
+        events_stored.inc(device=record.get('device', ''))
+    for device, merged in received.items():
+        if merged:
+            events_merged.inc(merged, device=device)
+
+def build_record(data):
+    record = {'string': data['string'], 'ts': event_time(data)}
+    device = data.get('device', None)
+    if device:
+        record['device'] = device
+    return record
+
+def render_record(record):
+    # Stored times are UTC epoch seconds; UTC+7 text is produced only here
+    rendered = dict(record)
+    if record.get('ts') is not None:
+        rendered['timestamp'] = format_epoch_to_utc7(record['ts'])
+    return rendered
+
+def event_error(data):
+    # Tags and device names end up as metric labels and query keys, so both must be text
+    if not isinstance(data, dict) or 'string' not in data:
+        return 'Missing "string"'
+    if not isinstance(data['string'], str):
+        return '"string" must be a string'
+    device = data.get('device')
+    if device is not None and not isinstance(device, str):
+        return '"device" must be a string'
+    return None
 
 @app.route('/receive', methods=['POST'])
 def receive_string():
     data = request.get_json()
-    if not data or 'string' not in data:
-        return jsonify({'error': 'Missing "string" in request body'}), 400
+    error = event_error(data)
+    if error:
+        return jsonify({'error': f'{error} in request body'}), 400
     
-    # Load current data
-    current_data = load_data()
-    logger.info("Loading current data for POST request")
+    # Any tag upload also counts as a heartbeat from its gate
+    if data.get('device'):
+        record_heartbeat(data['device'])
+    stored = store_events([data])
+    if not stored:
+        logger.info(f"Merged duplicate of {data['string']} from {data.get('device')}")
+        return jsonify({'message': 'Duplicate merged', 'received': data['string'], 'duplicate': True}), 200
     
-    received_string = data['string']
-    timestamp = data.get('timestamp', None)
-    device = data.get('device', None)
-    if timestamp:
-        timestamp = format_timestamp_to_utc7(timestamp)
+    record = render_record(stored[0])
+    logger.info(f"Stored record seq={record['seq']}")
     
-    # Add new data
-    new_data = {'string': received_string, 'timestamp': timestamp}
-    if device:
-        new_data['device'] = device
-    current_data.append(new_data)
-    
-    # Save to file
-    save_data(current_data)
-    logger.info(f"Saved new data, total records: {len(current_data)}")
-    
-    return jsonify({'message': 'String received', 'received': received_string, 'timestamp': timestamp, 'device': device}), 200
+    return jsonify({'message': 'String received', 'received': record['string'], 'timestamp': record['timestamp'], 'device': record.get('device'), 'registry': record.get('registry')}), 200
+
+def read_batch_body():
+    """Return the decoded JSON body, inflating it first if it was gzip-encoded."""
+    # Read at most one byte past the limit, so a chunked body without a length is capped too
+    raw = request.stream.read(MAX_BATCH_BYTES + 1)
+    if len(raw) > MAX_BATCH_BYTES:
+        raise ValueError('Batch is too large')
+    with serialization_seconds.time(operation='batch_decode'):
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            raw = inflater.decompress(raw, MAX_BATCH_BYTES + 1)
+            if len(raw) > MAX_BATCH_BYTES:
+                raise ValueError('Decompressed batch is too large')
+        return json.loads(raw)
+
+@app.route('/receive/batch', methods=['POST'])
+def receive_batch():
+    if request.content_length is not None and request.content_length > MAX_BATCH_BYTES:
+        return jsonify({'error': f'Batch exceeds {MAX_BATCH_BYTES} bytes'}), 413
+    try:
+        data = read_batch_body()
+    except (ValueError, zlib.error) as e:
+        return jsonify({'error': f'Invalid batch body: {e}'}), 400
+
+    # Accept either a bare array or {"events": [...]}
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list) or not events:
+        return jsonify({'error': 'Expected a non-empty array of events'}), 400
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({'error': f'Batch exceeds {MAX_BATCH_EVENTS} events'}), 413
+    for i, item in enumerate(events):
+        error = event_error(item)
+        if error:
+            return jsonify({'error': f'{error} in event {i}'}), 400
+
+    # The uploading gate is alive; its health can ride along as {"device", "status", "health"}
+    batch_device = data.get('device') if isinstance(data, dict) else None
+    if batch_device:
+        heartbeat, error = parse_heartbeat(data, 'device')
+        if error:
+            return jsonify({'error': error}), 400
+        record_heartbeat(**heartbeat)
+    for device in {item.get('device') for item in events} - {None, '', batch_device}:
+        record_heartbeat(device)
+
+    # One storage transaction for the whole batch
+    records = store_events(events)
+    merged = len(events) - len(records)
+    if records:
+        logger.info(f"Stored batch of {len(records)} records, seq {records[0]['seq']}-{records[-1]['seq']}, merged {merged}")
+
+    return jsonify({
+        'message': 'Batch received',
+        'count': len(records),
+        'merged': merged,
+        'last_seq': records[-1]['seq'] if records else repository.last_seq,
+    }), 200
 
 @app.route('/strings', methods=['GET'])
 def get_strings():
-    # Reload data from file for each request
-    current_data = load_data()
-    logger.info(f"Loaded {len(current_data)} records from file")
-    return jsonify({'strings': current_data}), 200
+    # Optional incremental parameters: ?since=<seq>&limit=<n>&device=<id>&tag=<epc>
+    try:
+        since = int(request.args.get('since', 0))
+        limit = request.args.get('limit')
+        limit = min(int(limit), MAX_PAGE_SIZE) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': '"since" and "limit" must be integers'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': '"limit" must be positive'}), 400
+    device = request.args.get('device')
+    tag = request.args.get('tag')
+
+    with storage_seconds.time(operation='query'):
+        events, has_more = repository.query(since=since, limit=limit, device=device, tag=tag)
+        total = len(repository)
+    cursor = events[-1]['seq'] if events else max(since, 0)
+    with serialization_seconds.time(operation='render'):
+        return jsonify({
+            'strings': [render_record(e) for e in events],
+            'cursor': cursor,
+            'has_more': has_more,
+            'total': total,
+        }), 200
 
 @app.route('/clear', methods=['GET', 'POST'])
 def clear_strings():
     try:
-        save_data([])
+        repository.clear()
         logger.info("Cleared all RFID tag data")
+        announce_changes()
         return jsonify({'message': 'All tags cleared'}), 200
     except Exception as e:
         logger.error(f"Error clearing data: {e}")
         return jsonify({'error': 'Failed to clear data'}), 500
 
-def format_timestamp_to_utc7(iso_timestamp):
+UTC7 = timezone(timedelta(hours=7))
+
+def format_epoch_to_utc7(epoch):
+    dt_utc7 = datetime.fromtimestamp(epoch, UTC7)
+    day = dt_utc7.strftime('%A')  # Full weekday name
+    time = dt_utc7.strftime('%H:%M:%S')
+    return f"{day} {time}"
+
+def parse_time_arg(name):
+    """Read a query parameter given as epoch seconds or an ISO 8601 timestamp."""
+    value = request.args.get(name)
+    if value is None:
+        return None
     try:
-        dt = datetime.fromisoformat(iso_timestamp.replace('Z', '+00:00'))
-        utc7 = timezone(timedelta(hours=7))
-        dt_utc7 = dt.astimezone(utc7)
-        day = dt_utc7.strftime('%A')  # Full weekday name
-        time = dt_utc7.strftime('%H:%M:%S')
-        return f"{day} {time}"
-    except Exception:
-        return iso_timestamp
+        seconds = float(value)
+    except ValueError:
+        return parse_iso_timestamp(value)
+    if not math.isfinite(seconds):
+        raise ValueError(f'"{name}" must be a finite number of seconds')
+    return seconds
+
+def parse_limit_arg():
+    limit = int(request.args.get('limit', MAX_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('"limit" must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+def time_range_response(query, operation, **filters):
+    # Shared by /events, /tags/<tag>/history and /archive/events: ?start=&end=&limit=, paged with ?after_ts=&after_seq=
+    try:
+        start = parse_time_arg('start')
+        end = parse_time_arg('end')
+        limit = parse_limit_arg()
+        after = None
+        if 'after_ts' in request.args:
+            after = (float(request.args['after_ts']), int(request.args.get('after_seq', 0)))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    with storage_seconds.time(operation=operation):
+        events, has_more = query(start=start, end=end, after=after, limit=limit, **filters)
+    result = dict(filters)
+    if has_more:
+        result['next'] = {'after_ts': events[-1]['ts'], 'after_seq': events[-1]['seq']}
+    with serialization_seconds.time(operation='render'):
+        result.update({'events': [render_record(e) for e in events], 'has_more': has_more})
+        return jsonify(result), 200
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    # Events in a time window, oldest first, optionally for one ?device= or ?tag=
+    return time_range_response(repository.query_time_range, 'query_time_range', device=request.args.get('device'), tag=request.args.get('tag'))
+
+@app.route('/gates/counts', methods=['GET'])
+def get_gate_counts():
+    # Detections per gate, optionally limited to ?start=&end=
+    try:
+        start = parse_time_arg('start')
+        end = parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    with storage_seconds.time(operation='count_by_device'):
+        counts = repository.count_by_device(start, end)
+    return jsonify({'start': start, 'end': end, 'counts': counts}), 200
+
+@app.route('/tags/<tag>/history', methods=['GET'])
+def get_tag_history(tag):
+    # Every sighting of one tag, oldest first
+    return time_range_response(repository.query_time_range, 'query_time_range', tag=tag)
+
+def compact_history():
+    if RETENTION_DAYS <= 0:
+        return
+    with storage_seconds.time(operation='archive'):
+        moved = repository.archive_before(retention_cutoff(RETENTION_DAYS, time.time()), archive)
+    if moved:
+        logger.info(f"Archived {moved} events older than {RETENTION_DAYS} days to {ARCHIVE_DIR}")
+
+def compaction_loop():
+    while True:
+        try:
+            compact_history()
+        except Exception as e:
+            logger.error(f"Error compacting history: {e}")
+        time.sleep(COMPACT_INTERVAL_SECONDS)
+
+@app.route('/archive', methods=['GET'])
+def list_archive():
+    # Archived daily segments, optionally only those overlapping ?start=&end=
+    try:
+        start = parse_time_arg('start')
+        end = parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    return jsonify({'retention_days': RETENTION_DAYS, 'segments': archive.segments(start, end)}), 200
+
+@app.route('/archive/events', methods=['GET'])
+def get_archived_events():
+    # Same parameters and paging as /events, served from the archive
+    return time_range_response(archive.query, 'archive_query', device=request.args.get('device'), tag=request.args.get('tag'))
+
+@app.route('/archive/<name>', methods=['GET'])
+def download_archive_segment(name):
+    # Export one segment as stored (gzip-compressed JSON Lines)
+    if archive.path(name) is None:
+        return jsonify({'error': f'No archive segment {name}'}), 404
+    return send_from_directory(ARCHIVE_DIR, name, as_attachment=True, mimetype='application/gzip')
+
+@app.route('/export', methods=['GET'])
+def export_events():
+    # Streams ?format=csv|ndjson|parquet for ?start=&end=&device=&tag=, oldest first;
+    # ?archive=1 also includes events already moved to the archive. Without a time
+    # filter, the undated events imported from rfid_data.json come first.
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'"format" must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export needs pyarrow installed on the server'}), 501
+    try:
+        start = parse_time_arg('start')
+        end = parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    filters = {'start': start, 'end': end, 'device': request.args.get('device'), 'tag': request.args.get('tag')}
+    include_archive = request.args.get('archive', '0').lower() in ('1', 'true', 'yes')
+
+    def records():
+        # One page of events in memory at a time, however large the export is
+        if start is None and end is None:
+            yield from repository.iter_undated(filters['device'], filters['tag'], page_size=EXPORT_PAGE_SIZE)
+        if include_archive:
+            yield from archive.iter_range(**filters)
+        yield from repository.iter_time_range(page_size=EXPORT_PAGE_SIZE, **filters)
+
+    mimetype, extension, chunks = EXPORT_FORMATS[export_format]
+    filename = f"iqosgate-export-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.{extension}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'X-Accel-Buffering': 'no'}
+    logger.info(f"Exporting {export_format} with {filters}, archive={include_archive}")
+    return Response(stream_with_context(chunks(records())), mimetype=mimetype, headers=headers)
+
+def parse_stats_window():
+    # ?start=&end= for the /stats endpoints, the last STATS_DEFAULT_WINDOW seconds by default
+    end = parse_time_arg('end')
+    if end is None:
+        end = time.time()
+    start = parse_time_arg('start')
+    if start is None:
+        start = end - STATS_DEFAULT_WINDOW
+    return start, end
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    # At-a-glance throughput: per-gate counts, unique tags and last-seen times for a window
+    try:
+        start, end = parse_stats_window()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    with storage_seconds.time(operation='stats'):
+        window_counts = {}
+        for _, device, count in repository.hourly_counts(start, end):
+            window_counts[device] = window_counts.get(device, 0) + count
+        gates = {}
+        for device, info in repository.gate_stats().items():
+            gates[device] = dict(info, window_count=window_counts.get(device, 0))
+        unique_tags = repository.unique_tag_count(start, end)
+    return jsonify({
+        'start': start,
+        'end': end,
+        'total': sum(window_counts.values()),
+        'unique_tags': unique_tags,
+        'gates': gates,
+    }), 200
+
+@app.route('/stats/hourly', methods=['GET'])
+def get_hourly_stats():
+    # Detections per hour, split by gate; ?device= limits it to one gate
+    try:
+        start, end = parse_stats_window()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    hours = []
+    for hour, device, count in repository.hourly_counts(start, end, request.args.get('device')):
+        if not hours or hours[-1]['hour'] != hour:
+            hours.append({'hour': hour, 'total': 0, 'counts': {}})
+        hours[-1]['total'] += count
+        if device:
+            hours[-1]['counts'][device] = count
+    return jsonify({'start': start, 'end': end, 'hours': hours}), 200
+
+@app.route('/stats/tags', methods=['GET'])
+def get_tag_stats():
+    # Last-seen time per tag, most recent first
+    try:
+        limit = parse_limit_arg()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    return jsonify({'tags': repository.tag_stats(limit=limit)}), 200
+
+@app.route('/stats/tags/<tag>', methods=['GET'])
+def get_single_tag_stats(tag):
+    stats = repository.tag_stats(tag=tag)
+    if not stats:
+        return jsonify({'error': f'Tag {tag} has not been seen'}), 404
+    return jsonify(stats[0]), 200
+
+@app.route('/registry', methods=['GET'])
+def get_registry():
+    counts = repository.registry_counts()
+    return jsonify({'version': repository.registry_version(), **{status: counts.get(status, 0) for status in REGISTRY_STATUSES}})
+
+@app.route('/registry', methods=['POST'])
+def update_registry():
+    # {"allow": [...], "deny": [...], "remove": [...]}, applied in that order as one version bump per tag
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with "allow", "deny" and/or "remove" lists'}), 400
+    changes = {}
+    for key in REGISTRY_STATUSES + ('remove',):
+        tags = data.get(key, [])
+        if not isinstance(tags, list):
+            return jsonify({'error': f'"{key}" must be a list of EPCs'}), 400
+        normalized = [normalize_epc(tag) for tag in tags]
+        if None in normalized:
+            bad = tags[normalized.index(None)]
+            return jsonify({'error': f'Invalid EPC in "{key}": {bad!r}'}), 400
+        changes[key] = normalized
+    total = sum(len(tags) for tags in changes.values())
+    if not total:
+        return jsonify({'error': 'No registry changes given'}), 400
+    if total > MAX_REGISTRY_UPDATE:
+        return jsonify({'error': f'Registry update exceeds {MAX_REGISTRY_UPDATE} entries'}), 413
+    with storage_seconds.time(operation='registry_update'):
+        version = repository.update_registry(**changes)
+    logger.info(f"Registry now at version {version}: {', '.join(f'{len(v)} {k}' for k, v in changes.items() if v)}")
+    return jsonify({'version': version, 'changed': total}), 200
+
+@app.route('/registry/snapshot', methods=['GET'])
+def get_registry_snapshot():
+    # Whole registry in the compact binary format readers load at startup
+    version = repository.registry_version()
+    headers = {'Content-Encoding': 'gzip', 'X-Registry-Version': str(version)}
+    return Response(stream_with_context(snapshot_chunks(version, repository.iter_registry())),
+                    mimetype='application/octet-stream', headers=headers)
+
+@app.route('/registry/changes', methods=['GET'])
+def get_registry_changes():
+    # Changes after ?since=<version>, oldest first; status null means the tag was removed
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', MAX_REGISTRY_CHANGES)), MAX_REGISTRY_CHANGES)
+    except ValueError:
+        return jsonify({'error': '"since" and "limit" must be integers'}), 400
+    if limit < 1:
+        return jsonify({'error': '"limit" must be positive'}), 400
+    current = repository.registry_version()
+    if since > current:
+        # The reader's copy is newer than the database, which must have been reset
+        return jsonify({'error': 'Unknown registry version; fetch /registry/snapshot', 'version': current}), 410
+    changes, has_more = repository.registry_changes(since, limit)
+    return jsonify({
+        'version': changes[-1][0] if has_more else current,
+        'changes': [{'tag': tag, 'status': status} for _, tag, status in changes],
+        'has_more': has_more,
+    })
+
+@app.route('/registry/<tag>', methods=['GET'])
+def get_registry_entry(tag):
+    status = repository.registry_status(normalize_epc(tag) or tag)
+    if status is None:
+        return jsonify({'error': f'{tag} is not in the registry'}), 404
+    return jsonify({'tag': tag, 'status': status})
+
+def expire_gate(gate_id):
+    # Called by the liveness sweeper the moment a gate's heartbeat deadline passes
+    if repository.expire_gate(gate_id, time.time() - TIMEOUT_SECONDS):
+        logger.info(f"Gate {gate_id} went offline: no heartbeat for {TIMEOUT_SECONDS}s")
+        announce_changes()
+        return
+    # Another worker stored a newer heartbeat; wait for that one to lapse instead
+    info = repository.gate_statuses().get(gate_id)
+    if info and info['status'] == 1:
+        liveness.watch(gate_id, info['last_update'])
+
+def record_heartbeat(gate_id, status=1, health=None):
+    now = time.time()
+    heartbeats.inc(gate=gate_id)
+    with storage_seconds.time(operation='heartbeat'):
+        repository.set_gate_status(gate_id, status, now, health)
+    if status == 1:
+        liveness.watch(gate_id, now)
+    else:
+        liveness.forget(gate_id)
+
+# Fields of a reader's health report and the types they must have; other fields are kept as sent
+HEALTH_FIELDS = {'serial_open': (bool,), 'last_frame': (int, float), 'upload_queue': (int,), 'metrics': (dict,)}
+HEALTH_METRICS_SECTIONS = ('latency', 'counters', 'gauges')
+
+def health_error(health):
+    for field, types in HEALTH_FIELDS.items():
+        value = health.get(field)
+        if value is not None and (not isinstance(value, types) or (bool not in types and isinstance(value, bool))):
+            return f'"health.{field}" has the wrong type'
+    reported = health.get('metrics') or {}
+    for section in HEALTH_METRICS_SECTIONS:
+        if section in reported and not isinstance(reported[section], dict):
+            return f'"health.metrics.{section}" must be an object'
+    return None
+
+def parse_heartbeat(data, id_key='gate_id'):
+    """Return ``(heartbeat, error)`` from a heartbeat-style request body."""
+    if not isinstance(data, dict) or id_key not in data:
+        return None, f'Missing "{id_key}" in request body'
+    gate_id = data[id_key]
+    if not isinstance(gate_id, str) or not gate_id.strip():
+        return None, f'"{id_key}" must be a non-empty string'
+    status = data.get('status', 1)
+    if status not in [0, 1] or isinstance(status, bool):
+        return None, 'Status must be 0 or 1'
+    health = data.get('health')
+    if health is not None:
+        if not isinstance(health, dict):
+            return None, '"health" must be an object'
+        error = health_error(health)
+        if error:
+            return None, error
+    return {'gate_id': gate_id, 'status': status, 'health': health}, None
+
+@app.route('/heartbeat', methods=['POST'])
+def receive_heartbeat():
+    # Lightweight liveness ping: {"gate_id", "status"?, "health"?}, answered with an empty 204
+    heartbeat, error = parse_heartbeat(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+    record_heartbeat(**heartbeat)
+    announce_changes()
+    return '', 204
 
 @app.route('/gate_status', methods=['POST'])
 def update_gate_status():
@@ -110,31 +665,174 @@ def update_gate_status():
     if not data or 'gate_id' not in data or 'status' not in data:
         return jsonify({'error': 'Missing "gate_id" or "status" in request body'}), 400
     
-    gate_id = data['gate_id']
-    status = data['status']
-    if status not in [0, 1]:
-        return jsonify({'error': 'Status must be 0 or 1'}), 400
+    heartbeat, error = parse_heartbeat(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    gate_statuses[gate_id] = {
-        'status': status,
-        'last_update': time.time()
-    }
+    gate_id = heartbeat['gate_id']
+    status = heartbeat['status']
+    record_heartbeat(**heartbeat)
     logger.info(f"Updated gate {gate_id} status to {'online' if status == 1 else 'offline'}")
+    announce_changes()
     return jsonify({'message': f'Gate {gate_id} status updated', 'gate_id': gate_id, 'status': status}), 200
 
 @app.route('/gate_status', methods=['GET'])
 def get_gate_statuses():
-    current_time = time.time()
+    # Kept current by heartbeats and the liveness sweeper, so nothing is recomputed here
     result = {}
-    for gate_id, info in gate_statuses.items():
-        last_update = info.get('last_update', 0)
-        status = info.get('status', 0)
-        if current_time - last_update > TIMEOUT_SECONDS:
-            # Consider offline if last update older than timeout
-            result[gate_id] = 0
-        else:
-            result[gate_id] = status
+    for gate_id, info in repository.gate_statuses().items():
+        result[gate_id] = info['status']
     return jsonify(result), 200
 
+@app.route('/gates/health', methods=['GET'])
+def get_gate_health():
+    # Status, last heartbeat time and the reader's own health report per gate
+    return jsonify(repository.gate_statuses()), 200
+
+def _section(value):
+    return value if isinstance(value, dict) else {}
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def reader_metrics():
+    """Gauges built from the health each reader last reported with its heartbeat."""
+    now = time.time()
+    online = Gauge('iqosgate_gate_online', 'Gate status as kept by the liveness sweeper', ['gate'])
+    last_heartbeat = Gauge('iqosgate_gate_last_heartbeat_age_seconds', 'Seconds since the last heartbeat', ['gate'])
+    last_frame = Gauge('iqosgate_reader_last_frame_age_seconds', 'Seconds since the reader last decoded a frame', ['gate'])
+    upload_queue = Gauge('iqosgate_reader_upload_queue', 'Reads waiting on the reader to be uploaded', ['gate'])
+    latency = Gauge('iqosgate_reader_latency_ms', 'Latency percentiles reported by the reader',
+                    ['gate', 'name', 'quantile'])
+    counters = Gauge('iqosgate_reader_count', 'Running totals reported by the reader', ['gate', 'name'])
+    gauges = Gauge('iqosgate_reader_gauge', 'Instantaneous values reported by the reader', ['gate', 'name'])
+    for gate_id, info in repository.gate_statuses().items():
+        online.set(info['status'], gate=gate_id)
+        last_heartbeat.set(now - info['last_update'], gate=gate_id)
+        # Health is whatever the reader sent; anything not shaped as expected is skipped
+        health = _section(info['health'])
+        if _is_number(health.get('last_frame')):
+            last_frame.set(now - health['last_frame'], gate=gate_id)
+        if _is_number(health.get('upload_queue')):
+            upload_queue.set(health['upload_queue'], gate=gate_id)
+        reported = _section(health.get('metrics'))
+        for name, summary in _section(reported.get('latency')).items():
+            summary = _section(summary)
+            for quantile, key in (('0.5', 'p50_ms'), ('0.99', 'p99_ms')):
+                if _is_number(summary.get(key)):
+                    latency.set(summary[key], gate=gate_id, name=name, quantile=quantile)
+        for name, value in _section(reported.get('counters')).items():
+            if _is_number(value):
+                counters.set(value, gate=gate_id, name=name)
+        for name, value in _section(reported.get('gauges')).items():
+            if _is_number(value):
+                gauges.set(value, gate=gate_id, name=name)
+    return [online, last_heartbeat, last_frame, upload_queue, latency, counters, gauges]
+
+metrics.add_collector(reader_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text exposition format
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# What this process has already pushed to its /stream subscribers. Any worker
+# may have written the change, so announcements are driven from the database.
+announce_lock = threading.Lock()
+announced = {'seq': None, 'clears': None, 'gates': {}}
+
+def announce_changes():
+    """Publish clears, tag events and gate status changes this process has not announced yet."""
+    with announce_lock:
+        if announced['seq'] is None:
+            # First call in this process: start after whatever is already stored
+            announced['seq'] = repository.last_seq
+            announced['clears'] = repository.clear_generation
+        if not len(broadcaster):
+            # Nobody is listening; just move the cursor forward
+            announced['seq'] = repository.last_seq
+            announced['clears'] = repository.clear_generation
+            announced['gates'] = {}
+            return
+        # A clear by any worker comes before the events stored after it
+        clears = repository.clear_generation
+        if clears != announced['clears']:
+            announced['clears'] = clears
+            broadcaster.publish('clear', {})
+        while True:
+            events, has_more = repository.query(since=announced['seq'], limit=MAX_PAGE_SIZE)
+            for record in events:
+                broadcaster.publish('tag', render_record(record))
+                announced['seq'] = record['seq']
+            if not has_more:
+                break
+        for gate_id, info in repository.gate_statuses().items():
+            status = info['status']
+            if announced['gates'].get(gate_id) != status:
+                announced['gates'][gate_id] = status
+                broadcaster.publish('gate_status', {'gate_id': gate_id, 'status': status})
+
+def announce_loop():
+    while True:
+        time.sleep(STREAM_POLL_SECONDS)
+        try:
+            announce_changes()
+        except Exception as e:
+            logger.error(f"Error announcing changes: {e}")
+
+# Its sweeper thread is started with the rest of the background work
+liveness = LivenessTracker(TIMEOUT_SECONDS, expire_gate)
+
+def resume_liveness():
+    # Statuses are persisted, so gates online before a restart resume their countdown;
+    # any that went quiet while the server was down are expired straight away
+    for gate_id, info in repository.gate_statuses().items():
+        if info['status'] == 1:
+            liveness.watch(gate_id, info['last_update'])
+
+# Background work of this process, started by its first request so that importing
+# the app (or forking a gunicorn worker) opens no database and starts no threads
+background_lock = threading.Lock()
+background_started = False
+
+@app.before_request
+def ensure_background():
+    global background_started
+    if background_started:
+        return
+    with background_lock:
+        if background_started:
+            return
+        migrate_legacy_data()
+        liveness.start()
+        for target in (announce_loop, compaction_loop, resume_liveness):
+            threading.Thread(target=target, daemon=True).start()
+        background_started = True
+
+@app.route('/stream', methods=['GET'])
+def stream_events():
+    # Server-Sent Events: "tag", "gate_status" and "clear" events as they happen
+    def generate():
+        # Subscribed only once the body is being sent, so a response that is never
+        # iterated leaves no queue behind
+        q = broadcaster.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event_type, data = q.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event_type is None:
+                    # Dropped for falling behind; the client reconnects and catches up
+                    return
+                yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            broadcaster.unsubscribe(q)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    app.run(debug=True, host='0.0.0.0', threaded=True)
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+DAY = 24 * 3600
+
+# events-<UTC day>-<first seq>-<last seq>.jsonl.gz
+SEGMENT_PATTERN = re.compile(r'^events-(\d{4}-\d{2}-\d{2})-(\d{12})-(\d{12})\.jsonl\.gz$')
+
+
+def day_of(ts):
+    """UTC calendar day of an epoch time, as ``YYYY-MM-DD``."""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+
+def day_start(day):
+    return datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()
+
+
+def _segment_name(day, first_seq, last_seq):
+    return f"events-{day}-{first_seq:012d}-{last_seq:012d}.jsonl.gz"
+
+
+class EventArchive:
+    """Compressed daily segments of tag events moved out of the hot database.
+
+    Each segment is a gzip-compressed JSON Lines file holding events of one
+    UTC day, named after that day and the range of ``seq`` values it holds.
+    A day usually has one segment; events that arrive late for an already
+    archived day end up in another one. Segments are written to a temporary
+    file and renamed into place, so a reader never sees a partial segment and
+    writing the same segment twice just replaces it. The directory is created
+    with the first segment.
+    """
+
+    def __init__(self, directory, compresslevel=6):
+        self.directory = directory
+        self.compresslevel = compresslevel
+
+    def write_segment(self, records):
+        """Write records of one UTC day as a new segment and return its name."""
+        day = day_of(records[0]['ts'])
+        seqs = [record['seq'] for record in records]
+        name = _segment_name(day, min(seqs), max(seqs))
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.compresslevel, mtime=0) as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return name
+
+    def segments(self, start=None, end=None):
+        """Segments whose day overlaps ``start <= ts < end``, oldest day first."""
+        if not os.path.isdir(self.directory):
+            return []  # nothing archived yet
+        result = []
+        first_day = day_of(start) if start is not None else None
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if not match:
+                continue
+            day = match.group(1)
+            if first_day is not None and day < first_day:
+                continue
+            if end is not None and day_start(day) >= end:
+                continue
+            result.append({
+                'name': name,
+                'day': day,
+                'first_seq': int(match.group(2)),
+                'last_seq': int(match.group(3)),
+                'bytes': os.path.getsize(os.path.join(self.directory, name)),
+            })
+        result.sort(key=lambda segment: (segment['day'], segment['first_seq']))
+        return result
+
+    def path(self, name):
+        """Full path of a segment, or None if ``name`` is not one."""
+        if not SEGMENT_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+    def iter_segment(self, name):
+        with gzip.open(os.path.join(self.directory, name), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_range(self, start=None, end=None, device=None, tag=None, after=None):
+        """Yield events with ``start <= ts < end`` in ``(ts, seq)`` order.
+
+        ``after`` is the ``(ts, seq)`` of the last event already seen.
+        Segments are read one day at a time, so memory is bounded by the
+        matching events of a single day.
+        """
+        if after is not None and (start is None or after[0] > start):
+            start = after[0]
+        by_day = {}
+        for segment in self.segments(start, end):
+            by_day.setdefault(segment['day'], []).append(segment['name'])
+
+        for day in sorted(by_day):
+            matching = []
+            for name in by_day[day]:
+                for record in self.iter_segment(name):
+                    ts = record['ts']
+                    if start is not None and ts < start:
+                        continue
+                    if end is not None and ts >= end:
+                        continue
+                    if device is not None and record.get('device') != device:
+                        continue
+                    if tag is not None and record['string'] != tag:
+                        continue
+                    if after is not None and (ts, record['seq']) <= tuple(after):
+                        continue
+                    matching.append(record)
+            matching.sort(key=lambda record: (record['ts'], record['seq']))
+            yield from matching
+
+    def query(self, start=None, end=None, device=None, tag=None, after=None, limit=None):
+        """Return ``(events, has_more)``; works like ``EventRepository.query_time_range``."""
+        events = []
+        for record in self.iter_range(start, end, device, tag, after):
+            if limit is not None and len(events) == limit:
+                return events, True
+            events.append(record)
+        return events, False
+
+
+def retention_cutoff(days, now):
+    """Start of the oldest UTC day kept hot when ``days`` days are retained."""
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (today - timedelta(days=days - 1)).timestamp()
@@ -0,0 +1,56 @@
+import queue
+import threading
+
+
+class Broadcaster:
+    """Fan out events to every connected stream subscriber.
+
+    Each subscriber gets its own bounded queue. A subscriber that falls so far
+    behind that its queue fills up is disconnected instead of slowing down
+    ingest; the dashboard reconnects and catches up through its cursor.
+    """
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event_type, data))
+            except queue.Full:
+                self.unsubscribe(q)
+                self._drop(q)
+
+    @staticmethod
+    def _drop(q):
+        # Make room for the sentinel so the stream generator notices. Publishers
+        # that listed the queue before it was unsubscribed may refill the freed
+        # slot, so keep trying; there are only so many of them.
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait((None, None))
+                return
+            except queue.Full:
+                continue
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
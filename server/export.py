@@ -0,0 +1,137 @@
+import csv
+import importlib.util
+import io
+import json
+from datetime import datetime, timezone
+
+# pyarrow is optional and slow to import, so it is only loaded by the first Parquet export
+pa = pq = None
+
+# ``timestamp`` is only set for events imported from rfid_data.json, which were
+# stored with that text and no ``ts``; their ``time`` and ``ts`` are empty
+EXPORT_COLUMNS = ('seq', 'time', 'ts', 'device', 'tag', 'registry', 'timestamp')
+
+# Text formats are flushed to the client whenever this much output is buffered
+CHUNK_BYTES = 64 * 1024
+
+# Rows per Parquet row group
+ROW_GROUP_SIZE = 10000
+
+
+def export_row(record):
+    ts = record['ts']
+    iso_time = None if ts is None else datetime.fromtimestamp(ts, timezone.utc).isoformat().replace('+00:00', 'Z')
+    legacy_time = record.get('timestamp') if ts is None else None
+    return (record['seq'], iso_time, ts, record.get('device'), record['string'], record.get('registry'), legacy_time)
+
+
+def csv_chunks(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for record in records:
+        writer.writerow(export_row(record))
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(records):
+    lines = []
+    size = 0
+    for record in records:
+        line = json.dumps(dict(zip(EXPORT_COLUMNS, export_row(record)))) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    yield ''.join(lines)
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last ``drain()``."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _load_pyarrow():
+    global pa, pq
+    if pq is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def parquet_chunks(records):
+    _load_pyarrow()
+    schema = pa.schema([
+        ('seq', pa.int64()),
+        ('time', pa.timestamp('us', tz='UTC')),
+        ('device', pa.string()),
+        ('tag', pa.string()),
+        ('registry', pa.string()),
+        ('timestamp', pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+
+    def row_group(rows):
+        writer.write_table(pa.table({
+            'seq': [row['seq'] for row in rows],
+            'time': [None if row['ts'] is None else int(row['ts'] * 1_000_000) for row in rows],
+            'device': [row.get('device') for row in rows],
+            'tag': [row['string'] for row in rows],
+            'registry': [row.get('registry') for row in rows],
+            'timestamp': [row.get('timestamp') if row['ts'] is None else None for row in rows],
+        }, schema=schema))
+        return sink.drain()
+
+    rows = []
+    for record in records:
+        rows.append(record)
+        if len(rows) == ROW_GROUP_SIZE:
+            yield row_group(rows)
+            rows = []
+    if rows:
+        yield row_group(rows)
+    writer.close()
+    yield sink.drain()
+
+
+# format -> (mimetype, file extension, chunk generator)
+FORMATS = {
+    'csv': ('text/csv', 'csv', csv_chunks),
+    'ndjson': ('application/x-ndjson', 'ndjson', ndjson_chunks),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', parquet_chunks),
+}
+
+
+def parquet_available():
+    return pq is not None or importlib.util.find_spec('pyarrow') is not None
@@ -0,0 +1,23 @@
+# Gunicorn settings for serving the API in production (see wsgi.py).
+# Each value can be overridden with the matching environment variable.
+import multiprocessing
+import os
+
+bind = os.environ.get('IQOSGATE_BIND', '0.0.0.0:5000')
+
+# Processes share state through the SQLite database only
+workers = int(os.environ.get('IQOSGATE_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers, because every open /stream connection holds a thread
+worker_class = 'gthread'
+threads = int(os.environ.get('IQOSGATE_THREADS', 16))
+
+# Long enough for slow readers uploading big batches over mobile links
+timeout = int(os.environ.get('IQOSGATE_TIMEOUT', 60))
+keepalive = 5
+
+# Do not preload: each worker starts its own background threads on its first request
+preload_app = False
+
+accesslog = '-'
+loglevel = os.environ.get('IQOSGATE_LOG_LEVEL', 'info')
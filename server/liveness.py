@@ -0,0 +1,81 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LivenessTracker:
+    """Heap of gate expiry deadlines with a sweeper thread that fires them.
+
+    ``watch()`` is called with the time of each heartbeat. The gate's deadline
+    is pushed onto a heap and the sweeper sleeps until the earliest one, so a
+    gate that stops reporting is handed to ``expire(gate_id)`` as soon as its
+    ``timeout`` runs out rather than on the next poll. A newer heartbeat does
+    not remove the old heap entry; entries older than the gate's latest
+    heartbeat are simply skipped when they come up.
+
+    The sweeper is started by ``start()``; deadlines watched before that are
+    kept and fire once it runs.
+    """
+
+    def __init__(self, timeout, expire):
+        self.timeout = timeout
+        self.expire = expire
+        self._heap = []
+        self._latest = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._sweep, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def watch(self, gate_id, last_update):
+        with self._cond:
+            if last_update <= self._latest.get(gate_id, float('-inf')):
+                return
+            self._latest[gate_id] = last_update
+            heapq.heappush(self._heap, (last_update + self.timeout, gate_id, last_update))
+            if self._heap[0][1] == gate_id:
+                # New earliest deadline: wake the sweeper so it sleeps for the right time
+                self._cond.notify()
+
+    def forget(self, gate_id):
+        with self._cond:
+            self._latest.pop(gate_id, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _next_expired(self):
+        with self._cond:
+            while not self._closed:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, gate_id, last_update = self._heap[0]
+                delay = deadline - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if self._latest.get(gate_id) == last_update:
+                    del self._latest[gate_id]
+                    return gate_id
+            return None
+
+    def _sweep(self):
+        while True:
+            gate_id = self._next_expired()
+            if gate_id is None:
+                return
+            try:
+                self.expire(gate_id)
+            except Exception as e:
+                logger.error(f"Error expiring gate {gate_id}: {e}")
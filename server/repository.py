@@ -0,0 +1,781 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    string TEXT NOT NULL,
+    timestamp TEXT,
+    device TEXT,
+    ts REAL
+);
+
+CREATE TABLE IF NOT EXISTS devices (
+    device TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS recent_tags (
+    tag TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS recent_tags_last_seen ON recent_tags (last_seen);
+
+CREATE TABLE IF NOT EXISTS gate_status (
+    gate_id TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    last_update REAL NOT NULL,
+    health TEXT
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied REAL NOT NULL,
+    records INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS clears (
+    generation INTEGER PRIMARY KEY AUTOINCREMENT,
+    cleared REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tag_registry (
+    tag TEXT PRIMARY KEY,
+    status TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS registry_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag TEXT NOT NULL,
+    status TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stats_hourly (
+    hour INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, device)
+);
+
+CREATE TABLE IF NOT EXISTS stats_hourly_tags (
+    hour INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (hour, tag)
+);
+
+CREATE TABLE IF NOT EXISTS stats_gates (
+    device TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    last_seen REAL,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_tags (
+    tag TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    last_seen REAL,
+    device TEXT
+);
+CREATE INDEX IF NOT EXISTS stats_tags_last_seen ON stats_tags (last_seen);
+'''
+
+# Created after the ts column is known to exist, so older databases can be upgraded first
+INDEXES = '''
+DROP INDEX IF EXISTS events_device;
+DROP INDEX IF EXISTS events_string;
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_device_seq ON events (device, seq);
+CREATE INDEX IF NOT EXISTS events_device_ts ON events (device, ts);
+CREATE INDEX IF NOT EXISTS events_string_ts ON events (string, ts);
+'''
+
+EVENT_COLUMNS = 'seq, string, timestamp, device, ts, registry, merged_count, devices'
+
+# Rebuilds the stats_* counters from the events table, for databases created
+# before they existed
+REBUILD_STATS = '''
+DELETE FROM stats_hourly;
+DELETE FROM stats_hourly_tags;
+DELETE FROM stats_gates;
+DELETE FROM stats_tags;
+INSERT INTO stats_hourly (hour, device, count)
+    SELECT CAST(ts / 3600 AS INTEGER) * 3600, COALESCE(device, ''), COUNT(*)
+    FROM events WHERE ts IS NOT NULL GROUP BY 1, 2;
+INSERT INTO stats_hourly_tags (hour, tag)
+    SELECT DISTINCT CAST(ts / 3600 AS INTEGER) * 3600, string FROM events WHERE ts IS NOT NULL;
+INSERT INTO stats_gates (device, count, last_seen)
+    SELECT device, COUNT(*), MAX(ts) FROM events WHERE device IS NOT NULL GROUP BY device;
+INSERT INTO stats_tags (tag, count, last_seen, device)
+    SELECT string, COUNT(*), MAX(ts), device FROM events GROUP BY string
+'''
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Largest number of events moved to the archive in one segment
+ARCHIVE_BATCH_ROWS = 50000
+
+# How long a process may archive before another one can take over; renewed after every segment
+ARCHIVE_LEASE_SECONDS = 600
+
+# recent_tags rows older than this are pruned once every PRUNE_EVERY ingested events;
+# kept well past the dedup window so replayed uploads are still merged correctly
+RECENT_TAGS_KEEP_SECONDS = 24 * 3600
+PRUNE_EVERY = 1000
+
+# Bytes of the database file each connection reads through a memory map
+# instead of read() calls; the OS page cache is shared by every connection
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class EventRepository:
+    """Tag events, dedup state and gate statuses in one shared SQLite database.
+
+    Events are stored with their UTC epoch time in ``ts`` and indexed by time,
+    by device and by tag, so time-window, per-gate and per-tag queries are
+    index range scans rather than scans of the whole history. ``timestamp``
+    only holds the pre-formatted text of rows imported from older storage,
+    which never recorded a date.
+
+    The database runs in WAL mode, so any number of server processes can read
+    while one writes, and every write is a short ``BEGIN IMMEDIATE``
+    transaction serialised by SQLite's own lock. ``seq`` is an AUTOINCREMENT
+    key: it is unique across processes and never reused, even after a clear,
+    so dashboard cursors stay valid. Each thread gets its own connection.
+
+    Nothing is opened until the repository is first used, so creating one is
+    free; the first connection of a process sets up or upgrades the schema.
+    """
+
+    def __init__(self, path, busy_timeout=10.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._ingested = 0
+        self._setup_lock = threading.Lock()
+        self._ready = False
+        self._lease_holder = uuid.uuid4().hex
+
+    def _setup(self, conn):
+        with self._setup_lock:
+            if not self._ready:
+                self._create_schema(conn)
+                self._ready = True
+
+    def _create_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Schema setup and upgrades in one transaction, so workers starting together don't race
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._execute_script(conn, SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(events)')}
+            if 'ts' not in columns:
+                conn.execute('ALTER TABLE events ADD COLUMN ts REAL')
+            if 'registry' not in columns:
+                conn.execute('ALTER TABLE events ADD COLUMN registry TEXT')
+            if 'merged_count' not in columns:
+                conn.execute('ALTER TABLE events ADD COLUMN merged_count INTEGER NOT NULL DEFAULT 0')
+                conn.execute('ALTER TABLE events ADD COLUMN devices TEXT')
+            if 'seq' not in {row['name'] for row in conn.execute('PRAGMA table_info(recent_tags)')}:
+                conn.execute('ALTER TABLE recent_tags ADD COLUMN seq INTEGER')
+            if 'merged' not in {row['name'] for row in conn.execute('PRAGMA table_info(stats_gates)')}:
+                conn.execute('ALTER TABLE stats_gates ADD COLUMN merged INTEGER NOT NULL DEFAULT 0')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(gate_status)')}
+            if 'health' not in columns:
+                conn.execute('ALTER TABLE gate_status ADD COLUMN health TEXT')
+            self._execute_script(conn, INDEXES)
+            if conn.execute('SELECT 1 FROM devices LIMIT 1').fetchone() is None:
+                conn.execute('INSERT OR IGNORE INTO devices SELECT DISTINCT device FROM events WHERE device IS NOT NULL')
+            if (conn.execute('SELECT 1 FROM stats_tags LIMIT 1').fetchone() is None
+                    and conn.execute('SELECT 1 FROM events LIMIT 1').fetchone() is not None):
+                self._execute_script(conn, REBUILD_STATS)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _execute_script(conn, script):
+        # executescript() would commit the surrounding transaction
+        for statement in script.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            conn.row_factory = sqlite3.Row
+            if not self._ready:
+                self._setup(conn)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_record(row):
+        record = {'seq': row['seq'], 'string': row['string'], 'timestamp': row['timestamp'], 'ts': row['ts']}
+        if row['device']:
+            record['device'] = row['device']
+        if row['registry']:
+            record['registry'] = row['registry']
+        if row['merged_count']:
+            record['merged_count'] = row['merged_count']
+        if row['devices']:
+            record['devices'] = json.loads(row['devices'])
+        return record
+
+    @staticmethod
+    def _row_values(record):
+        string = record['string']
+        if not isinstance(string, str):
+            string = json.dumps(string)
+        return string, record.get('timestamp'), record.get('device'), record.get('ts'), record.get('registry')
+
+    # -- writing ----------------------------------------------------------
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def append_many(self, records, dedup_window=None):
+        """Insert records in one transaction and return them with their ``seq``.
+
+        With ``dedup_window`` set, a record whose tag was stored less than
+        that many seconds before or after its ``ts`` is merged into that
+        event instead of being inserted: the event's ``merged_count`` goes
+        up, another gate that saw it is added to its ``devices``, the
+        sighting is counted in that gate's ``merged`` stats and becomes the
+        tag's last sighting in its per-tag stats. The window is
+        anchored at the stored event, so a tag that stays in range is stored
+        again once per window. Only the inserted records are returned.
+
+        Each stored record gets the tag's ``registry`` status ('allow' or
+        'deny') as it stands at ingest, if the tag is registered.
+        """
+        conn = self._conn()
+        stored = []
+        merged = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record in records:
+                if dedup_window and self._merge_duplicate(conn, record, dedup_window):
+                    merged.append(record)
+                    continue
+                status = self._registry_status(conn, record['string'])
+                if status is not None:
+                    record = dict(record, registry=status)
+                cursor = conn.execute(
+                    'INSERT INTO events (string, timestamp, device, ts, registry) VALUES (?, ?, ?, ?, ?)',
+                    self._row_values(record))
+                stored.append(dict(record, seq=cursor.lastrowid))
+                if dedup_window:
+                    self._remember_sighting(conn, stored[-1])
+            self._remember_devices(conn, stored + merged)
+            self._update_stats(conn, stored, merged)
+            self._ingested += len(records)
+            if dedup_window and self._ingested >= PRUNE_EVERY:
+                conn.execute('DELETE FROM recent_tags WHERE last_seen < ?', (time.time() - RECENT_TAGS_KEEP_SECONDS,))
+                self._ingested = 0
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return stored
+
+    @staticmethod
+    def _remember_devices(conn, records):
+        devices = {record.get('device') for record in records} - {None}
+        conn.executemany('INSERT OR IGNORE INTO devices (device) VALUES (?)', [(d,) for d in devices])
+
+    @staticmethod
+    def _update_stats(conn, records, merged=()):
+        # Fold the new events into the rolling counters, in the same transaction
+        hourly = {}
+        hourly_tags = set()
+        gates = {}
+        tags = {}
+        merged_by_gate = {}
+        # Merged sightings are not counted as events, but do move the tag's last sighting
+        for record, counted in [(record, 1) for record in records] + [(record, 0) for record in merged]:
+            tag = record['string']
+            if not isinstance(tag, str):
+                tag = json.dumps(tag)
+            device = record.get('device')
+            ts = record.get('ts')
+            if counted and ts is not None:
+                hour = int(ts // HOUR) * HOUR
+                key = (hour, device or '')
+                hourly[key] = hourly.get(key, 0) + 1
+                hourly_tags.add((hour, tag))
+            if device:
+                by_gate = gates if counted else merged_by_gate
+                count, last_seen = by_gate.get(device, (0, None))
+                by_gate[device] = (count + 1, _latest(last_seen, ts))
+            count, last_seen, last_device = tags.get(tag, (0, None, None))
+            if last_seen is None or (ts is not None and ts >= last_seen):
+                last_device = device
+            tags[tag] = (count + counted, _latest(last_seen, ts), last_device)
+        conn.executemany(
+            'INSERT INTO stats_hourly (hour, device, count) VALUES (?, ?, ?) '
+            'ON CONFLICT(hour, device) DO UPDATE SET count = count + excluded.count',
+            [(hour, device, count) for (hour, device), count in hourly.items()])
+        conn.executemany('INSERT OR IGNORE INTO stats_hourly_tags (hour, tag) VALUES (?, ?)', hourly_tags)
+        conn.executemany(
+            'INSERT INTO stats_gates (device, count, last_seen) VALUES (?, ?, ?) '
+            'ON CONFLICT(device) DO UPDATE SET count = count + excluded.count, '
+            'last_seen = MAX(COALESCE(last_seen, excluded.last_seen), COALESCE(excluded.last_seen, last_seen))',
+            [(device, count, last_seen) for device, (count, last_seen) in gates.items()])
+        conn.executemany(
+            'INSERT INTO stats_gates (device, count, last_seen, merged) VALUES (?, 0, ?, ?) '
+            'ON CONFLICT(device) DO UPDATE SET merged = merged + excluded.merged, '
+            'last_seen = MAX(COALESCE(last_seen, excluded.last_seen), COALESCE(excluded.last_seen, last_seen))',
+            [(device, last_seen, count) for device, (count, last_seen) in merged_by_gate.items()])
+        conn.executemany(
+            'INSERT INTO stats_tags (tag, count, last_seen, device) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(tag) DO UPDATE SET count = count + excluded.count, '
+            'device = CASE WHEN last_seen IS NULL OR excluded.last_seen >= last_seen '
+            'THEN excluded.device ELSE device END, '
+            'last_seen = MAX(COALESCE(last_seen, excluded.last_seen), COALESCE(excluded.last_seen, last_seen))',
+            [(tag, count, last_seen, device) for tag, (count, last_seen, device) in tags.items()])
+
+    @staticmethod
+    def _registry_status(conn, tag):
+        if not isinstance(tag, str):
+            return None
+        row = conn.execute('SELECT status FROM tag_registry WHERE tag = ?', (tag,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _merge_duplicate(conn, record, window):
+        tag = record['string']
+        event_time = record.get('ts')
+        if not isinstance(tag, str) or event_time is None:
+            return False
+        row = conn.execute(
+            'SELECT e.seq, e.ts, e.device, e.devices FROM recent_tags r JOIN events e ON e.seq = r.seq '
+            'WHERE r.tag = ?', (tag,)).fetchone()
+        if row is None or row['ts'] is None or abs(event_time - row['ts']) >= window:
+            return False
+        devices = json.loads(row['devices']) if row['devices'] else []
+        device = record.get('device')
+        if device and device != row['device'] and device not in devices:
+            devices.append(device)
+        conn.execute('UPDATE events SET merged_count = merged_count + 1, devices = ? WHERE seq = ?',
+                     (json.dumps(devices) if devices else None, row['seq']))
+        conn.execute('UPDATE recent_tags SET last_seen = MAX(last_seen, ?) WHERE tag = ?', (event_time, tag))
+        return True
+
+    @staticmethod
+    def _remember_sighting(conn, record):
+        # The newest stored event of a tag is the one later sightings are merged into
+        if not isinstance(record['string'], str) or record.get('ts') is None:
+            return
+        conn.execute(
+            'INSERT INTO recent_tags (tag, last_seen, seq) VALUES (?, ?, ?) '
+            'ON CONFLICT(tag) DO UPDATE SET last_seen = excluded.last_seen, seq = excluded.seq '
+            'WHERE excluded.last_seen >= recent_tags.last_seen',
+            (record['string'], record['ts'], record['seq']))
+
+    def import_records(self, migration, records):
+        """Bulk-load existing history as the one-time migration ``migration``.
+
+        The records are appended after any events already stored and the
+        migration is recorded in the same transaction, so it is applied
+        exactly once however many workers try. Returns the number of records
+        imported, or None if the migration was applied before.
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._migration_applied(conn, migration):
+                conn.execute('ROLLBACK')
+                return None
+            values = [self._row_values(record) for record in records]
+            conn.executemany(
+                'INSERT INTO events (string, timestamp, device, ts, registry) VALUES (?, ?, ?, ?, ?)', values)
+            self._remember_devices(conn, records)
+            self._update_stats(conn, records)
+            conn.execute('INSERT INTO migrations (name, applied, records) VALUES (?, ?, ?)',
+                         (migration, time.time(), len(values)))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return len(values)
+
+    @staticmethod
+    def _migration_applied(conn, migration):
+        return conn.execute('SELECT 1 FROM migrations WHERE name = ?', (migration,)).fetchone() is not None
+
+    def migration_applied(self, migration):
+        return self._migration_applied(self._conn(), migration)
+
+    def archive_before(self, cutoff, archive, batch_size=ARCHIVE_BATCH_ROWS):
+        """Move events with ``ts < cutoff`` into ``archive`` and return how many were moved.
+
+        Works through one UTC day (at most ``batch_size`` events) at a time.
+        The day's events are read and written out as a segment without the
+        write lock, then deleted by ``seq`` in a short transaction, so ingest
+        only waits for the delete. Only the process holding the ``archive``
+        lease does any of this, so concurrent workers never archive the same
+        events twice; the others return 0 straight away.
+
+        Events without a ``ts``, imported from rfid_data.json, have no day
+        to be archived under and stay until the next clear.
+
+        Per-tag stats of tags not seen since ``cutoff`` are pruned too, so
+        storage stays bounded. The hourly and per-gate counters hold a few
+        rows per gate and hour and keep covering the whole history.
+        """
+        if not self.acquire_lease('archive', ARCHIVE_LEASE_SECONDS):
+            return 0
+        conn = self._conn()
+        moved = 0
+        try:
+            while True:
+                oldest = conn.execute('SELECT MIN(ts) FROM events WHERE ts < ?', (cutoff,)).fetchone()[0]
+                if oldest is None:
+                    break
+                start = oldest - oldest % DAY
+                rows = conn.execute(
+                    f'SELECT {EVENT_COLUMNS} FROM events WHERE ts >= ? AND ts < ? ORDER BY ts, seq LIMIT ?',
+                    (start, min(start + DAY, cutoff), batch_size)).fetchall()
+                records = [self._to_record(row) for row in rows]
+                archive.write_segment(records)
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany('DELETE FROM events WHERE seq = ?', [(record['seq'],) for record in records])
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                moved += len(records)
+                if not self.acquire_lease('archive', ARCHIVE_LEASE_SECONDS):
+                    return moved
+            self._prune_stats(conn, cutoff)
+        finally:
+            self.release_lease('archive')
+        return moved
+
+    @staticmethod
+    def _prune_stats(conn, cutoff):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM stats_hourly_tags WHERE hour + ? <= ?', (HOUR, cutoff))
+            conn.execute('DELETE FROM stats_tags WHERE last_seen < ?', (cutoff,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    # -- leases -------------------------------------------------------------
+    # A lease lets one process at a time do housekeeping that every worker
+    # would otherwise start; it expires, so a crashed holder is taken over.
+
+    def acquire_lease(self, name, seconds):
+        """Take or renew lease ``name`` for ``seconds``; return False if another process holds it."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT holder, expires FROM leases WHERE name = ?', (name,)).fetchone()
+            acquired = row is None or row['holder'] == self._lease_holder or row['expires'] < now
+            if acquired:
+                conn.execute(
+                    'INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires',
+                    (name, self._lease_holder, now + seconds))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return acquired
+
+    def release_lease(self, name):
+        self._conn().execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, self._lease_holder))
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM events')
+            conn.execute('DELETE FROM recent_tags')
+            for table in ('stats_hourly', 'stats_hourly_tags', 'stats_gates', 'stats_tags'):
+                conn.execute(f'DELETE FROM {table}')
+            # Every process polls this to tell its own /stream subscribers about the clear
+            conn.execute('INSERT INTO clears (cleared) VALUES (?)', (time.time(),))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    # -- reading ----------------------------------------------------------
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    @property
+    def last_seq(self):
+        row = self._conn().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def clear_generation(self):
+        """Number of clears so far, across every process sharing the database."""
+        row = self._conn().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'clears'").fetchone()
+        return row[0] if row else 0
+
+    def query(self, since=0, limit=None, device=None, tag=None):
+        """Return ``(events, has_more)`` for events after ``since`` in ``seq`` order."""
+        sql = f'SELECT {EVENT_COLUMNS} FROM events WHERE seq > ?'
+        params = [since]
+        if device is not None:
+            sql += ' AND device = ?'
+            params.append(device)
+        if tag is not None:
+            sql += ' AND string = ?'
+            params.append(tag)
+        sql += ' ORDER BY seq'
+        return self._fetch_page(sql, params, limit)
+
+    def query_time_range(self, start=None, end=None, device=None, tag=None,
+                         after=None, limit=None):
+        """Return ``(events, has_more)`` with ``start <= ts < end`` in time order.
+
+        ``after`` is the ``(ts, seq)`` of the last event of the previous page.
+        """
+        sql = f'SELECT {EVENT_COLUMNS} FROM events WHERE ts IS NOT NULL'
+        params = []
+        if start is not None:
+            sql += ' AND ts >= ?'
+            params.append(start)
+        if end is not None:
+            sql += ' AND ts < ?'
+            params.append(end)
+        if device is not None:
+            sql += ' AND device = ?'
+            params.append(device)
+        if tag is not None:
+            sql += ' AND string = ?'
+            params.append(tag)
+        if after is not None:
+            sql += ' AND (ts > ? OR (ts = ? AND seq > ?))'
+            params.extend([after[0], after[0], after[1]])
+        sql += ' ORDER BY ts, seq'
+        return self._fetch_page(sql, params, limit)
+
+    def iter_time_range(self, start=None, end=None, device=None, tag=None, page_size=5000):
+        """Yield every event ``query_time_range`` would return, one keyset page at a time."""
+        after = None
+        while True:
+            events, has_more = self.query_time_range(start, end, device, tag, after=after, limit=page_size)
+            yield from events
+            if not has_more:
+                return
+            after = (events[-1]['ts'], events[-1]['seq'])
+
+    def iter_undated(self, device=None, tag=None, page_size=5000):
+        """Yield events without a ``ts`` (imported from rfid_data.json) in ``seq`` order."""
+        sql = f'SELECT {EVENT_COLUMNS} FROM events WHERE ts IS NULL AND seq > ?'
+        params = []
+        if device is not None:
+            sql += ' AND device = ?'
+            params.append(device)
+        if tag is not None:
+            sql += ' AND string = ?'
+            params.append(tag)
+        sql += ' ORDER BY seq'
+        after = 0
+        while True:
+            events, has_more = self._fetch_page(sql, [after] + params, page_size)
+            yield from events
+            if not has_more:
+                return
+            after = events[-1]['seq']
+
+    def _fetch_page(self, sql, params, limit):
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = params + [limit + 1]
+        rows = self._conn().execute(sql, params).fetchall()
+        has_more = limit is not None and len(rows) > limit
+        return [self._to_record(row) for row in rows[:limit]], has_more
+
+    def devices(self):
+        return [row[0] for row in self._conn().execute('SELECT device FROM devices ORDER BY device')]
+
+    def count_by_device(self, start=None, end=None):
+        """Number of events per device with ``start <= ts < end``."""
+        sql = 'SELECT COUNT(*) FROM events WHERE device = ?'
+        bounds = []
+        if start is not None:
+            sql += ' AND ts >= ?'
+            bounds.append(start)
+        if end is not None:
+            sql += ' AND ts < ?'
+            bounds.append(end)
+        conn = self._conn()
+        # One covering range scan of (device, ts) per gate
+        return {device: conn.execute(sql, [device] + bounds).fetchone()[0]
+                for device in self.devices()}
+
+    # -- stats ------------------------------------------------------------
+    # Read from the counters kept up to date by append_many, never from events.
+    # Windows are whole hours: start is rounded down to the hour it falls in.
+
+    @staticmethod
+    def _hour_bounds(start, end):
+        sql = ''
+        params = []
+        if start is not None:
+            sql += ' AND hour >= ?'
+            params.append(int(start // HOUR) * HOUR)
+        if end is not None:
+            sql += ' AND hour < ?'
+            params.append(end)
+        return sql, params
+
+    def hourly_counts(self, start=None, end=None, device=None):
+        """Return ``[(hour, device, count)]`` ordered by hour; ``device`` is '' for untagged events."""
+        bounds, params = self._hour_bounds(start, end)
+        sql = 'SELECT hour, device, count FROM stats_hourly WHERE 1 = 1' + bounds
+        if device is not None:
+            sql += ' AND device = ?'
+            params.append(device)
+        sql += ' ORDER BY hour, device'
+        return [tuple(row) for row in self._conn().execute(sql, params)]
+
+    def unique_tag_count(self, start=None, end=None):
+        bounds, params = self._hour_bounds(start, end)
+        return self._conn().execute(
+            'SELECT COUNT(DISTINCT tag) FROM stats_hourly_tags WHERE 1 = 1' + bounds, params).fetchone()[0]
+
+    def gate_stats(self):
+        """All-time event count, merged duplicate sightings and last-seen time per gate."""
+        rows = self._conn().execute('SELECT device, count, last_seen, merged FROM stats_gates ORDER BY device')
+        return {row['device']: {'count': row['count'], 'last_seen': row['last_seen'], 'merged': row['merged']}
+                for row in rows}
+
+    def tag_stats(self, tag=None, limit=None):
+        """Count, last-seen time and last gate per tag, most recently seen first."""
+        sql = 'SELECT tag, count, last_seen, device FROM stats_tags'
+        params = []
+        if tag is not None:
+            sql += ' WHERE tag = ?'
+            params.append(tag)
+        sql += ' ORDER BY last_seen DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(row) for row in self._conn().execute(sql, params)]
+
+    # -- tag registry -----------------------------------------------------
+    # Every change gets a version from registry_changes, so readers can keep a
+    # local copy current by fetching only the changes after the version they hold.
+
+    def update_registry(self, allow=(), deny=(), remove=()):
+        """Apply registry changes in one transaction and return the new version."""
+        changes = [(tag, 'allow') for tag in allow] + [(tag, 'deny') for tag in deny] + [(tag, None) for tag in remove]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for tag, status in changes:
+                if status is None:
+                    conn.execute('DELETE FROM tag_registry WHERE tag = ?', (tag,))
+                else:
+                    conn.execute(
+                        'INSERT INTO tag_registry (tag, status) VALUES (?, ?) '
+                        'ON CONFLICT(tag) DO UPDATE SET status = excluded.status',
+                        (tag, status))
+            conn.executemany('INSERT INTO registry_changes (tag, status) VALUES (?, ?)', changes)
+            version = self._registry_version(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+
+    @staticmethod
+    def _registry_version(conn):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'registry_changes'").fetchone()
+        return row[0] if row else 0
+
+    def registry_version(self):
+        return self._registry_version(self._conn())
+
+    def registry_status(self, tag):
+        return self._registry_status(self._conn(), tag)
+
+    def registry_counts(self):
+        rows = self._conn().execute('SELECT status, COUNT(*) FROM tag_registry GROUP BY status')
+        return {status: count for status, count in rows}
+
+    def registry_changes(self, since, limit=None):
+        """Return ``(changes, has_more)``: ``(version, tag, status)`` after ``since``; status None means removed."""
+        sql = 'SELECT version, tag, status FROM registry_changes WHERE version > ? ORDER BY version'
+        params = [since]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+        rows = [tuple(row) for row in self._conn().execute(sql, params)]
+        has_more = limit is not None and len(rows) > limit
+        return rows[:limit], has_more
+
+    def iter_registry(self, batch_size=10000):
+        """Yield every ``(tag, status)`` in the registry, fetched in batches."""
+        cursor = self._conn().execute('SELECT tag, status FROM tag_registry')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], row[1]
+
+    # -- gate status ------------------------------------------------------
+
+    def set_gate_status(self, gate_id, status, last_update, health=None):
+        """Record a heartbeat; ``health`` replaces the stored reader health when given."""
+        self._conn().execute(
+            'INSERT INTO gate_status (gate_id, status, last_update, health) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(gate_id) DO UPDATE SET status = excluded.status, '
+            'last_update = MAX(last_update, excluded.last_update), '
+            'health = COALESCE(excluded.health, health)',
+            (gate_id, status, last_update, json.dumps(health) if health is not None else None))
+
+    def expire_gate(self, gate_id, stale_before):
+        """Mark a gate offline if it has not been heard from since ``stale_before``.
+
+        Returns True if this call took the gate offline. The check and the
+        update are one statement, so only one worker reports the transition
+        and a heartbeat stored by another worker in the meantime wins.
+        """
+        cursor = self._conn().execute(
+            'UPDATE gate_status SET status = 0 WHERE gate_id = ? AND status != 0 AND last_update <= ?',
+            (gate_id, stale_before))
+        return cursor.rowcount > 0
+
+    def gate_statuses(self):
+        rows = self._conn().execute('SELECT gate_id, status, last_update, health FROM gate_status').fetchall()
+        return {row['gate_id']: {'status': row['status'], 'last_update': row['last_update'],
+                                 'health': json.loads(row['health']) if row['health'] else None}
+                for row in rows}
+
+
+def _latest(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
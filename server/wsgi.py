@@ -0,0 +1,7 @@
+# Production entry point:
+#
+#     cd server && gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Every worker opens the same SQLite database, so ingest scales across
+# processes; see gunicorn.conf.py for worker and thread counts.
+from app import app
@@ -0,0 +1,60 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'reader'))
+
+from dedup import DedupCache  # noqa: E402
+
+
+def test_sighting_inside_the_window_is_a_duplicate():
+    cache = DedupCache(ttl=10)
+    assert not cache.seen('aa', now=0)
+    assert cache.seen('aa', now=9.999)
+
+
+def test_sighting_exactly_one_window_later_is_new():
+    cache = DedupCache(ttl=10)
+    assert not cache.seen('aa', now=0)
+    assert not cache.seen('aa', now=10)
+
+
+def test_window_slides_with_every_sighting():
+    cache = DedupCache(ttl=10)
+    assert not cache.seen('aa', now=0)
+    # A tag left in range is reported once, however long it stays
+    for now in (8, 16, 24, 32):
+        assert cache.seen('aa', now=now)
+    assert not cache.seen('aa', now=42)
+
+
+def test_late_sighting_does_not_move_the_window_back():
+    cache = DedupCache(ttl=10)
+    assert not cache.seen('aa', now=20)
+    assert cache.seen('aa', now=15)
+    assert not cache.seen('aa', now=30)
+
+
+def test_tags_are_tracked_separately():
+    cache = DedupCache(ttl=10)
+    assert not cache.seen('aa', now=0)
+    assert not cache.seen('bb', now=1)
+    assert cache.seen('aa', now=2)
+
+
+def test_expired_entries_are_dropped():
+    cache = DedupCache(ttl=10)
+    cache.seen('aa', now=0)
+    cache.seen('bb', now=5)
+    cache.seen('cc', now=12)
+    assert len(cache) == 2
+
+
+def test_size_is_bounded_by_evicting_the_least_recently_seen():
+    cache = DedupCache(ttl=10, max_size=2)
+    cache.seen('aa', now=0)
+    cache.seen('bb', now=1)
+    cache.seen('aa', now=2)
+    cache.seen('cc', now=3)
+    assert len(cache) == 2
+    assert cache.seen('aa', now=4)
+    assert not cache.seen('bb', now=4)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'reader'))
+
+from framer import FrameParser, build_frame, crc16  # noqa: E402
+
+FRAME_A = build_frame(b'\x00\xee\x00' + bytes(range(12)))
+FRAME_B = build_frame(b'\x00\xee\x00' + bytes(range(100, 112)))
+
+
+def test_crc16_check_value():
+    # CRC-16/MCRF4XX of the standard check string
+    assert crc16(b'123456789') == 0x6F91
+
+
+def test_frame_split_at_every_position():
+    for split in range(1, len(FRAME_A)):
+        parser = FrameParser()
+        assert parser.feed(FRAME_A[:split], now=0) == []
+        assert parser.feed(FRAME_A[split:], now=0.01) == [FRAME_A]
+        assert parser.dropped_bytes == 0
+
+
+def test_frames_across_chunk_boundaries():
+    stream = FRAME_A + FRAME_B + FRAME_A
+    for size in (1, 3, 7, len(FRAME_A) + 1):
+        parser = FrameParser()
+        frames = []
+        for start in range(0, len(stream), size):
+            frames.extend(parser.feed(stream[start:start + size], now=0))
+        assert frames == [FRAME_A, FRAME_B, FRAME_A]
+
+
+def test_resync_after_leading_noise():
+    parser = FrameParser()
+    noise = b'\x01\x02\x00'
+    assert parser.feed(noise + FRAME_A, now=0) == [FRAME_A]
+    assert parser.dropped_bytes == len(noise)
+
+
+def test_noise_that_looks_like_a_long_frame_waits_for_the_timeout():
+    parser = FrameParser(frame_timeout=0.1)
+    assert parser.feed(b'\xff' + FRAME_A, now=0) == []
+    assert parser.feed(FRAME_B, now=0.2) == [FRAME_A, FRAME_B]
+    assert parser.dropped_bytes == 1
+
+
+def test_corrupt_frame_is_skipped():
+    corrupt = bytearray(FRAME_A)
+    corrupt[6] ^= 0xFF
+    parser = FrameParser(frame_timeout=0.1)
+    frames = parser.feed(bytes(corrupt) + FRAME_B, now=0) + parser.expire(now=0.2)
+    assert frames == [FRAME_B]
+    assert parser.dropped_bytes == len(corrupt)
+
+
+def test_corrupt_frame_is_kept_without_crc_check():
+    corrupt = bytearray(FRAME_A)
+    corrupt[6] ^= 0xFF
+    parser = FrameParser(check_crc=False)
+    assert parser.feed(bytes(corrupt), now=0) == [bytes(corrupt)]
+
+
+def test_stale_partial_frame_is_dropped():
+    parser = FrameParser(frame_timeout=0.1)
+    # A length byte promising more data than ever arrives
+    assert parser.feed(b'\x40\x00\xee', now=0) == []
+    assert parser.feed(FRAME_B, now=0.05) == []
+    assert parser.expire(now=0.2) == [FRAME_B]
+    assert parser.dropped_bytes == 3
+
+
+def test_partial_frame_within_timeout_is_kept():
+    parser = FrameParser(frame_timeout=0.1)
+    parser.feed(FRAME_A[:5], now=0)
+    assert parser.expire(now=0.05) == []
+    assert parser.feed(FRAME_A[5:], now=0.06) == [FRAME_A]
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'reader'))
+
+from spool import Spool  # noqa: E402
+
+
+def test_spool_survives_a_restart_in_order(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    spool = Spool(path)
+    spool.put_many([{'string': 'aa'}, {'string': 'bb'}])
+    spool.put_many([{'string': 'cc'}])
+    spool.close()
+
+    spool = Spool(path)
+    rows = spool.peek(10)
+    assert [event['string'] for _, event in rows] == ['aa', 'bb', 'cc']
+    spool.ack(rows[1][0])
+    assert [event['string'] for _, event in spool.peek(10)] == ['cc']
+    assert len(spool) == 1
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+
+
+class _FlakyClient:
+    """Fails the first ``failures`` uploads, then accepts everything."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    def post_json(self, url, payload):
+        if self.failures:
+            self.failures -= 1
+            return _Response(503)
+        self.batches.append([event['string'] for event in payload])
+        return _Response(200)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_failed_uploads_are_replayed_in_order(tmp_path):
+    pytest.importorskip('requests')
+    from uploader import BatchUploader
+
+    client = _FlakyClient(failures=2)
+    spool = Spool(str(tmp_path / 'spool.db'))
+    uploader = BatchUploader('http://server/receive/batch', 'GateA', spool, max_batch=2, max_delay=0.01,
+                             client=client, initial_backoff=0.01, max_backoff=0.02)
+    for tag in ('aa', 'bb', 'cc'):
+        uploader.submit(tag)
+    _wait_for(lambda: uploader.pending() == 0)
+    uploader.close()
+
+    assert [tag for batch in client.batches for tag in batch] == ['aa', 'bb', 'cc']
+    assert len(spool) == 0
+
+
+def test_rejected_batch_is_dropped_after_max_rejects(tmp_path):
+    pytest.importorskip('requests')
+    from uploader import BatchUploader
+
+    class RejectingClient(_FlakyClient):
+        def post_json(self, url, payload):
+            self.batches.append([event['string'] for event in payload])
+            return _Response(400)
+
+    client = RejectingClient(failures=0)
+    spool = Spool(str(tmp_path / 'spool.db'))
+    uploader = BatchUploader('http://server/receive/batch', 'GateA', spool, max_batch=1, max_delay=0.01,
+                             client=client, initial_backoff=0.01, max_backoff=0.02, max_rejects=3)
+    uploader.submit('aa')
+    _wait_for(lambda: uploader.pending() == 0)
+    uploader.close()
+
+    assert client.batches == [['aa']] * 3
@@ -0,0 +1,134 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', 'server'))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', 'reader'))
+
+from tag_registry import snapshot_chunks  # noqa: E402
+
+pytest.importorskip('requests')
+
+from registry import RegistrySync, TagRegistry  # noqa: E402
+
+ALLOWED = 'e28011700000020f6f7d8a13'
+DENIED = '300833b2ddd9014000000001'
+OTHER = '300833b2ddd9014000000002'
+
+
+def server_snapshot(version, entries):
+    return gzip.decompress(b''.join(snapshot_chunks(version, entries)))
+
+
+def test_server_snapshot_loads_into_the_reader():
+    registry = TagRegistry()
+    registry.load_snapshot(server_snapshot(7, [(ALLOWED, 'allow'), (DENIED, 'deny')]))
+    assert registry.version == 7
+    assert registry.status(ALLOWED) == 'allow'
+    assert registry.status(DENIED) == 'deny'
+    assert registry.status(OTHER) is None
+    assert registry.status('not hex') is None
+
+
+def test_snapshot_round_trips():
+    registry = TagRegistry()
+    registry.load_snapshot(server_snapshot(3, [(ALLOWED, 'allow'), (DENIED, 'deny')]))
+    copy = TagRegistry()
+    copy.load_snapshot(registry.snapshot())
+    assert copy.version == 3
+    assert (copy.status(ALLOWED), copy.status(DENIED)) == ('allow', 'deny')
+
+
+def test_truncated_snapshot_is_rejected():
+    with pytest.raises(ValueError):
+        TagRegistry().load_snapshot(server_snapshot(1, [(ALLOWED, 'allow')])[:-1])
+
+
+def test_changes_are_applied_in_order():
+    registry = TagRegistry()
+    registry.load_snapshot(server_snapshot(1, [(ALLOWED, 'allow')]))
+    registry.apply_changes([
+        {'tag': DENIED, 'status': 'allow'},
+        {'tag': DENIED, 'status': 'deny'},
+        {'tag': ALLOWED, 'status': None},
+    ], version=4)
+    assert registry.version == 4
+    assert registry.status(DENIED) == 'deny'
+    assert registry.status(ALLOWED) is None
+    assert len(registry) == 1
+
+
+class _Response:
+    def __init__(self, status_code, json=None, content=b''):
+        self.status_code = status_code
+        self._json = json
+        self.content = content
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        assert self.status_code < 400
+
+
+class _Server:
+    """Answers /registry/snapshot and /registry/changes like the server does."""
+
+    def __init__(self, snapshot, changes, version, reset=False):
+        self.snapshot = snapshot
+        self.changes = changes
+        self.version = version
+        self.reset = reset
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append((url.rsplit('/', 1)[-1], params))
+        if url.endswith('/snapshot'):
+            return _Response(200, content=self.snapshot)
+        if self.reset:
+            return _Response(410)
+        since = params['since']
+        pending = [change for change in self.changes if change['version'] > since]
+        page = pending[:1]
+        return _Response(200, json={
+            'changes': page,
+            'version': page[-1]['version'] if page else self.version,
+            'has_more': len(pending) > 1,
+        })
+
+
+def test_sync_starts_from_a_snapshot_then_pages_through_changes(tmp_path):
+    server = _Server(server_snapshot(2, [(ALLOWED, 'allow')]), [
+        {'version': 3, 'tag': DENIED, 'status': 'deny'},
+        {'version': 4, 'tag': ALLOWED, 'status': None},
+    ], version=4)
+    cache = str(tmp_path / 'tag_registry.bin')
+    registry = TagRegistry()
+    sync = RegistrySync(registry, server, 'http://server/', cache_path=cache)
+
+    assert sync.sync()
+    assert registry.version == 2
+    assert sync.sync()
+    assert registry.version == 4
+    assert (registry.status(ALLOWED), registry.status(DENIED)) == (None, 'deny')
+    assert not sync.sync()
+    assert [name for name, _ in server.requests] == ['snapshot', 'changes', 'changes', 'changes']
+
+    cached = TagRegistry()
+    with open(cache, 'rb') as f:
+        cached.load_snapshot(f.read())
+    assert cached.version == 4 and cached.status(DENIED) == 'deny'
+
+
+def test_sync_reloads_the_snapshot_when_the_server_was_reset():
+    registry = TagRegistry()
+    registry.load_snapshot(server_snapshot(9, [(ALLOWED, 'allow')]))
+    server = _Server(server_snapshot(1, [(DENIED, 'deny')]), [], version=1, reset=True)
+    sync = RegistrySync(registry, server, 'http://server')
+
+    assert sync.sync()
+    assert registry.version == 1
+    assert (registry.status(ALLOWED), registry.status(DENIED)) == (None, 'deny')
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def test_root_script_imports_reader_modules():
+    # rfid_alarm_new.py is run from the repository root and puts reader/ on sys.path itself
+    pytest.importorskip('serial')
+    pytest.importorskip('requests')
+    result = subprocess.run([sys.executable, '-c', 'import rfid_alarm_new'], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_api_client_imports_flat():
+    # The reader scripts run with reader/ itself on sys.path
+    pytest.importorskip('requests')
+    result = subprocess.run([sys.executable, '-c', 'import api_client'], cwd=os.path.join(ROOT, 'reader'),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,33 @@
+import csv
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from export import csv_chunks  # noqa: E402
+from repository import EventRepository  # noqa: E402
+
+
+def test_undated_legacy_events_are_exported(tmp_path):
+    repository = EventRepository(str(tmp_path / 'events.db'))
+    repository.import_records('rfid_data.json', [{'string': 'aa', 'timestamp': '08:15:00', 'device': 'GateA'}])
+    repository.append({'string': 'bb', 'ts': 1700000000.0, 'device': 'GateB'})
+
+    records = list(repository.iter_undated()) + list(repository.iter_time_range())
+    rows = list(csv.DictReader(io.StringIO(''.join(csv_chunks(records)))))
+
+    assert [row['tag'] for row in rows] == ['aa', 'bb']
+    assert rows[0]['time'] == '' and rows[0]['ts'] == '' and rows[0]['timestamp'] == '08:15:00'
+    assert rows[1]['time'] == '2023-11-14T22:13:20Z' and rows[1]['timestamp'] == ''
+
+
+def test_undated_events_are_filtered_by_device(tmp_path):
+    repository = EventRepository(str(tmp_path / 'events.db'))
+    repository.import_records('rfid_data.json', [
+        {'string': 'aa', 'timestamp': '08:15:00', 'device': 'GateA'},
+        {'string': 'bb', 'timestamp': '08:16:00', 'device': 'GateB'},
+    ])
+
+    assert [record['string'] for record in repository.iter_undated(device='GateB')] == ['bb']
+    assert list(repository.iter_time_range()) == []
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from prom_metrics import Registry, _Metric  # noqa: E402
+
+
+def test_mixed_label_types_render():
+    registry = Registry()
+    heartbeats = registry.counter('heartbeats', 'Heartbeats', ['gate'])
+    heartbeats.inc(gate='GateA')
+    heartbeats.inc(gate=5)
+    text = registry.render()
+    assert 'heartbeats_total{gate="5"} 1' in text
+    assert 'heartbeats_total{gate="GateA"} 1' in text
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric('m', 'help')
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from repository import EventRepository  # noqa: E402
+
+WINDOW = 10
+
+
+@pytest.fixture
+def repository(tmp_path):
+    return EventRepository(str(tmp_path / 'events.db'))
+
+
+def sighting(ts, device='GateA', tag='aa'):
+    return {'string': tag, 'ts': float(ts), 'device': device}
+
+
+def stored(repository, *sightings):
+    return [record['ts'] for record in repository.append_many(list(sightings), dedup_window=WINDOW)]
+
+
+def test_sighting_inside_the_window_is_merged(repository):
+    assert stored(repository, sighting(0)) == [0]
+    assert stored(repository, sighting(WINDOW - 0.5)) == []
+    assert len(repository) == 1
+
+
+def test_sighting_one_window_after_the_stored_event_is_stored(repository):
+    stored(repository, sighting(0))
+    assert stored(repository, sighting(WINDOW)) == [WINDOW]
+
+
+def test_window_is_anchored_at_the_stored_event(repository):
+    # Merged sightings do not extend the window: a tag left in range is stored once per window
+    assert stored(repository, sighting(0), sighting(5), sighting(9)) == [0]
+    assert stored(repository, sighting(12), sighting(18)) == [12]
+    assert stored(repository, sighting(22)) == [22]
+
+
+def test_late_sighting_inside_the_window_is_merged(repository):
+    stored(repository, sighting(100))
+    assert stored(repository, sighting(95)) == []
+
+
+def test_tags_are_merged_separately(repository):
+    assert stored(repository, sighting(0, tag='aa'), sighting(1, tag='bb')) == [0, 1]
+
+
+def test_merge_is_recorded_on_the_kept_event(repository):
+    stored(repository, sighting(0, 'GateA'), sighting(2, 'GateB'), sighting(3, 'GateB'), sighting(4, 'GateA'))
+    [event], _ = repository.query()
+    assert event['device'] == 'GateA'
+    assert event['merged_count'] == 3
+    assert event['devices'] == ['GateB']
+
+
+def test_merged_sightings_update_gate_and_tag_stats(repository):
+    stored(repository, sighting(0, 'GateA'))
+    stored(repository, sighting(5, 'GateB'))
+    gates = repository.gate_stats()
+    assert gates['GateA'] == {'count': 1, 'last_seen': 0, 'merged': 0}
+    assert gates['GateB'] == {'count': 0, 'last_seen': 5, 'merged': 1}
+    assert repository.tag_stats() == [{'tag': 'aa', 'count': 1, 'last_seen': 5, 'device': 'GateB'}]
+
+
+def test_stats_count_stored_events_per_hour(repository):
+    stored(repository, sighting(0), sighting(5), sighting(3600, 'GateB'), sighting(3700, 'GateB', tag='bb'))
+    assert repository.hourly_counts() == [(0, 'GateA', 1), (3600, 'GateB', 2)]
+    assert repository.unique_tag_count() == 2
+
+
+def test_registry_status_is_recorded_at_ingest(repository):
+    tag = 'e28011700000020f6f7d8a13'
+    repository.update_registry(deny=[tag])
+    [event] = repository.append_many([sighting(0, tag=tag)])
+    assert event['registry'] == 'deny'
+    repository.update_registry(remove=[tag])
+    assert repository.query()[0][0]['registry'] == 'deny'
+
+
+def test_legacy_import_runs_once(repository):
+    repository.append(sighting(0))
+    assert repository.import_records('rfid_data.json', [{'string': 'bb', 'timestamp': '08:15:00'}]) == 1
+    assert repository.import_records('rfid_data.json', [{'string': 'cc', 'timestamp': '08:16:00'}]) is None
+    assert [record['string'] for record in repository.query()[0]] == ['aa', 'bb']
+
+
+def test_clear_removes_events_and_stats(repository):
+    stored(repository, sighting(0))
+    generation = repository.clear_generation
+    repository.clear()
+    assert len(repository) == 0
+    assert repository.tag_stats() == []
+    assert repository.clear_generation == generation + 1
+    # The dedup state went with the events
+    assert stored(repository, sighting(1)) == [1]